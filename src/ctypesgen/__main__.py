@@ -18,7 +18,7 @@ from ctypesgen import (
     printer_json,
 )
 from ctypesgen.printer_python import (
-    txtpath, get_priv_paths,
+    txtpath, get_priv_paths, get_priv_prefixes,
 )
 
 
@@ -60,6 +60,16 @@ else:
     ExtendAction = None
 
 
+class DlopenFlagsAction (argparse.Action):
+    def __call__(self, parser, namespace, values, option_string=None):
+        if sys.platform.startswith("win32"):
+            parser.error(f"{option_string} is not supported on Windows")
+        for a, b in (("RTLD_LAZY", "RTLD_NOW"), ("RTLD_GLOBAL", "RTLD_LOCAL")):
+            if a in values and b in values:
+                parser.error(f"{option_string}: {a} and {b} are mutually exclusive")
+        setattr(namespace, self.dest, values)
+
+
 class LocalArgumentParser (argparse.ArgumentParser):
     def convert_arg_line_to_args(self, arg_line):
         return shlex.split(arg_line)
@@ -186,6 +196,14 @@ def get_parser():
         dest="search_sys",
         help="Deactivate fallback system library search; mandate that the library be contained in the given libdirs instead."
     )
+    parser.add_argument(
+        "--dlopen-flags",
+        nargs="+",
+        choices=("RTLD_LAZY", "RTLD_NOW", "RTLD_GLOBAL", "RTLD_LOCAL"),
+        metavar="FLAG",
+        action=DlopenFlagsAction,
+        help="Flags to load the library with, instead of ctypes' default mode (POSIX only). Note that ctypes already resolves all symbols at load time unless 'RTLD_LAZY' is given, which defers resolution until first use, e.g. to load a library with dependencies that are only partially available. 'RTLD_GLOBAL' makes the library's symbols available to libraries loaded later.",
+    )
     parser.add_argument(
         "--no-embed-templates",
         action="store_false",
@@ -233,6 +251,12 @@ def get_parser():
         type=generic_path_t,
         help="Save preprocessor output to the specified FILENAME",
     )
+    parser.add_argument(
+        "--preproc-cachedir",
+        metavar="DIR",
+        type=generic_path_t,
+        help="Cache preprocessor output in DIR, and re-use it on later runs with the same command, headers and include files. Note that files which did not exist at the time of caching are not tracked, so adding a header that would shadow another one in the include path is not noticed.",
+    )
     parser.add_argument(
         "--preproc-errcheck",
         action=BooleanOptionalAction,
@@ -481,6 +505,7 @@ def main(given_argv=sys.argv[1:]):
     """
     # preparation: flush CWD for path stripping
     get_priv_paths.cache_clear()
+    get_priv_prefixes.cache_clear()
     args = get_parser().parse_args(given_argv)
     args.cppargs = list( itertools.chain(*args.cppargs) )
     cmd_str = " ".join(["ctypesgen"] + [shlex.quote(txtpath(a)) for a in given_argv])
@@ -513,6 +538,7 @@ def api_main(args):
     
     # preparation: refresh CWD for path stripping
     get_priv_paths.cache_clear()
+    get_priv_prefixes.cache_clear()
     parser = get_parser()
     
     required_args = _get_parser_requires(parser)
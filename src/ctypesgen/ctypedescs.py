@@ -72,6 +72,9 @@ ctypes_type_map_python_builtin = {
     ("va_list", True, 0): "c_void_p",
 }
 
+# Merged table for py_string() lookups. Which types are accepted is decided by the parser's type_map.
+ctypes_type_map_full = {**ctypes_type_map, **ctypes_type_map_python_builtin}
+
 
 # This protocol is used for walking type trees.
 class CtypesTypeVisitor:
@@ -124,9 +127,9 @@ class CollectingTypeVisitor:
 # Remove one level of indirection from function pointer; needed for typedefs
 # and function parameters.
 def remove_function_pointer(t):
-    if type(t) == CtypesPointer and type(t.destination) == CtypesFunction:
+    if type(t) is CtypesPointer and type(t.destination) is CtypesFunction:
         return t.destination
-    elif type(t) == CtypesPointer:
+    elif type(t) is CtypesPointer:
         t.destination = remove_function_pointer(t.destination)
         return t
     else:
@@ -134,16 +137,30 @@ def remove_function_pointer(t):
 
 
 class CtypesType:
+    
+    # identifier is only set on function parameters, by the parser
+    __slots__ = ("errors", "identifier")
+    
     def __init__(self):
         self.errors = []
     
     def __repr__(self):
-        return f"<Ctype ({type(self).__name__}) '{self.py_string()}'>"
+        try:
+            string = repr(self.py_string())
+        except ValueError:
+            string = "<error in ctype>"
+        return f"<Ctype ({type(self).__name__}) {string}>"
     
     def error(self, message, cls=None):
         self.errors.append((message, cls))
     
+    def children(self):
+        # the ctypes (or expression nodes) this type is composed of, in visiting order
+        return ()
+    
     def visit(self, visitor):
+        for child in self.children():
+            child.visit(visitor)
         for error, cls in self.errors:
             visitor.visit_error(error, cls)
 
@@ -151,6 +168,8 @@ class CtypesType:
 class CtypesSimple(CtypesType):
     """Represents a builtin type, like "char" or "int"."""
     
+    __slots__ = ("name", "signed", "longs")
+    
     def __init__(self, name, signed, longs):
         super().__init__()
         self.name = name
@@ -158,10 +177,13 @@ class CtypesSimple(CtypesType):
         self.longs = longs
     
     def py_string(self, ignore_can_be_ctype=None):
-        return ctypes_type_map[(self.name, self.signed, self.longs)]
+        return ctypes_type_map_full[(self.name, self.signed, self.longs)]
 
 
 class CtypesSpecial(CtypesType):
+    
+    __slots__ = ("name", )
+    
     def __init__(self, name):
         super().__init__()
         self.name = name
@@ -173,6 +195,8 @@ class CtypesSpecial(CtypesType):
 class CtypesTypedef(CtypesType):
     """Represents a type defined by a typedef."""
     
+    __slots__ = ("name", )
+    
     def __init__(self, name):
         super().__init__()
         self.name = name
@@ -187,58 +211,64 @@ class CtypesTypedef(CtypesType):
 
 
 class CtypesBitfield(CtypesType):
+    
+    __slots__ = ("base", "bitfield")
+    
     def __init__(self, base, bitfield):
         super().__init__()
         self.base = base
         self.bitfield = bitfield
     
-    def visit(self, visitor):
-        self.base.visit(visitor)
-        super().visit(visitor)
+    def children(self):
+        return (self.base, )
     
     def py_string(self, ignore_can_be_ctype=None):
         return self.base.py_string()
 
 
 class CtypesPointer(CtypesType):
+    
+    __slots__ = ("destination", "qualifiers")
+    
     def __init__(self, destination, qualifiers):
         super().__init__()
         self.destination = destination
         self.qualifiers = qualifiers
     
-    def visit(self, visitor):
-        if self.destination:
-            self.destination.visit(visitor)
-        super().visit(visitor)
+    def children(self):
+        return (self.destination, ) if self.destination else ()
     
     def py_string(self, ignore_can_be_ctype=None):
         return "POINTER(%s)" % self.destination.py_string()
 
 
 class CtypesArray(CtypesType):
+    
+    __slots__ = ("base", "count")
+    
     def __init__(self, base, count):
         super().__init__()
         self.base = base
         self.count = count
     
-    def visit(self, visitor):
-        self.base.visit(visitor)
-        if self.count:
-            self.count.visit(visitor)
-        super().visit(visitor)
+    def children(self):
+        return (self.base, self.count) if self.count else (self.base, )
     
     def py_string(self, ignore_can_be_ctype=None):
         if self.count is None:
             # In a function declaration, an empty array is equivalent to a pointer.
             # For struct FAMs, the ctypesparser changes count None to ConstantExpressionNode(0).
             return "POINTER(%s)" % self.base.py_string()
-        if type(self.base) == CtypesArray:
+        if type(self.base) is CtypesArray:
             return "(%s) * int(%s)" % (self.base.py_string(), self.count.py_string(False))
         else:
             return "%s * int(%s)" % (self.base.py_string(), self.count.py_string(False))
 
 
 class CtypesNoErrorCheck:
+    
+    __slots__ = ()
+    
     def py_string(self, ignore_can_be_ctype=None):
         return "None"
     
@@ -249,6 +279,9 @@ class CtypesNoErrorCheck:
 
 
 class CtypesFunction(CtypesType):
+    
+    __slots__ = ("restype", "errcheck", "argtypes", "variadic", "attrib")
+    
     def __init__(self, restype, parameters, variadic, options, attrib=None):
         super().__init__()
         self.restype = restype
@@ -265,11 +298,8 @@ class CtypesFunction(CtypesType):
             elif restype_str == "POINTER(c_wchar)":
                 self.restype = CtypesSpecial("WideString")
     
-    def visit(self, visitor):
-        self.restype.visit(visitor)
-        for a in self.argtypes:
-            a.visit(visitor)
-        super().visit(visitor)
+    def children(self):
+        return (self.restype, *self.argtypes)
     
     def py_string(self, ignore_can_be_ctype=None):
         return "CFUNCTYPE(UNCHECKED(%s), %s)" % (
@@ -287,6 +317,9 @@ def anon_struct_tagnum():
 
 
 class CtypesStruct(CtypesType):
+    
+    __slots__ = ("tag", "attrib", "variety", "members", "opaque", "src", "anonymous")
+    
     def __init__(self, tag, attrib, variety, members, src=None):
         super().__init__()
         self.tag = tag
@@ -295,21 +328,16 @@ class CtypesStruct(CtypesType):
         self.members = members
         self.opaque = self.members is None
         self.src = src
-        tag_is_int = type(self.tag) == int
+        tag_is_int = type(self.tag) is int
         self.anonymous = tag_is_int or not self.tag
         if self.anonymous:
             self.tag = f"anon_{self.tag if tag_is_int else anon_struct_tagnum()}"
     
-    def get_required_types(self):
-        types = super().get_required_types()
-        types.add((self.variety, self.tag))
-        return types
+    def children(self):
+        return () if self.opaque else tuple(m[1] for m in self.members)
     
     def visit(self, visitor):
         visitor.visit_struct(self)
-        if not self.opaque:
-            for name, ctype in self.members:
-                ctype.visit(visitor)
         super().visit(visitor)
     
     def get_subtypes(self):
@@ -328,6 +356,9 @@ def anon_enum_tag():
 
 
 class CtypesEnum(CtypesType):
+    
+    __slots__ = ("tag", "anonymous", "enumerators", "opaque", "src")
+    
     def __init__(self, tag, enumerators, src=None):
         super().__init__()
         self.tag = tag
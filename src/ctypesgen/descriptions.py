@@ -28,6 +28,10 @@ class Description:
     """Represents a constant, typedef, struct, function, variable, enum,
     or macro description. Description is an abstract base class."""
     
+    # Descriptions are tracked in requirements/dependents sets and may be renamed in place, so they must compare by identity. Subclasses shall not override this.
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+    
     def __init__(self, src=None):
         self.src = src  # A tuple of (filename, lineno)
         
@@ -54,7 +58,7 @@ class Description:
         self.warnings = []
     
     def add_requirements(self, *reqs):
-        self.requirements |= set(reqs)
+        self.requirements.update(reqs)
         for req in reqs:
             req.dependents.add(self)
     
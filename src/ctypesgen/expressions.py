@@ -46,6 +46,9 @@ class EvaluationContext:
 
 
 class ExpressionNode:
+    
+    __slots__ = ("errors", )
+    
     def __init__(self):
         self.errors = []
     
@@ -65,6 +68,9 @@ class ExpressionNode:
 
 
 class ConstantExpressionNode(ExpressionNode):
+    
+    __slots__ = ("value", "is_literal")
+    
     def __init__(self, value, is_literal=False):
         ExpressionNode.__init__(self)
         self.value = value
@@ -84,6 +90,9 @@ class ConstantExpressionNode(ExpressionNode):
 
 
 class IdentifierExpressionNode(ExpressionNode):
+    
+    __slots__ = ("name", )
+    
     def __init__(self, name):
         ExpressionNode.__init__(self)
         self.name = name
@@ -102,6 +111,9 @@ class IdentifierExpressionNode(ExpressionNode):
 
 
 class ParameterExpressionNode(ExpressionNode):
+    
+    __slots__ = ("name", )
+    
     def __init__(self, name):
         ExpressionNode.__init__(self)
         self.name = name
@@ -119,6 +131,9 @@ class ParameterExpressionNode(ExpressionNode):
 
 
 class UnaryExpressionNode(ExpressionNode):
+    
+    __slots__ = ("name", "op", "format", "child_can_be_ctype", "child")
+    
     def __init__(self, name, op, format, child_can_be_ctype, child):
         ExpressionNode.__init__(self)
         self.name = name
@@ -142,6 +157,9 @@ class UnaryExpressionNode(ExpressionNode):
 
 
 class SizeOfExpressionNode(ExpressionNode):
+    
+    __slots__ = ("child", )
+    
     def __init__(self, child):
         ExpressionNode.__init__(self)
         self.child = child
@@ -164,6 +182,9 @@ class SizeOfExpressionNode(ExpressionNode):
 
 
 class BinaryExpressionNode(ExpressionNode):
+    
+    __slots__ = ("name", "op", "format", "can_be_ctype", "left", "right")
+    
     def __init__(self, name, op, format, can_be_ctype, left, right):
         ExpressionNode.__init__(self)
         self.name = name
@@ -192,6 +213,9 @@ class BinaryExpressionNode(ExpressionNode):
 
 
 class ConditionalExpressionNode(ExpressionNode):
+    
+    __slots__ = ("cond", "yes", "no")
+    
     def __init__(self, cond, yes, no):
         ExpressionNode.__init__(self)
         self.cond = cond
@@ -211,14 +235,17 @@ class ConditionalExpressionNode(ExpressionNode):
             return self.no.evaluate(context)
     
     def py_string(self, can_be_ctype):
-        return "%s and %s or %s" % (
-            self.cond.py_string(True),
+        return "(%s if %s else %s)" % (
             self.yes.py_string(can_be_ctype),
+            self.cond.py_string(True),
             self.no.py_string(can_be_ctype),
         )
 
 
 class AttributeExpressionNode(ExpressionNode):
+    
+    __slots__ = ("op", "format", "base", "attribute")
+    
     def __init__(self, op, format, base, attribute):
         ExpressionNode.__init__(self)
         self.op = op
@@ -229,7 +256,7 @@ class AttributeExpressionNode(ExpressionNode):
         # Attribute access will raise parse errors if you don't do this.
         # Fortunately, the processor module does the same thing to
         # the struct member name.
-        if self.attribute in keyword.kwlist:
+        if keyword.iskeyword(self.attribute):
             self.attribute += "_"
     
     def visit(self, visitor):
@@ -245,6 +272,9 @@ class AttributeExpressionNode(ExpressionNode):
 
 
 class CallExpressionNode(ExpressionNode):
+    
+    __slots__ = ("function", "arguments")
+    
     def __init__(self, function, arguments):
         ExpressionNode.__init__(self)
         self.function = function
@@ -272,6 +302,8 @@ class TypeCastExpressionNode(ExpressionNode):
     possibility that this does not support all types of casts.
     """
     
+    __slots__ = ("base", "ctype")
+    
     def __init__(self, base, ctype):
         ExpressionNode.__init__(self)
         self.base = base
@@ -300,6 +332,9 @@ class TypeCastExpressionNode(ExpressionNode):
 
 
 class UnsupportedExpressionNode(ExpressionNode):
+    
+    __slots__ = ("message", )
+    
     def __init__(self, message):
         ExpressionNode.__init__(self)
         self.message = message
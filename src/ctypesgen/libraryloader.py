@@ -1,35 +1,59 @@
+import os
 import sys
 import ctypes
 import ctypes.util
-import pathlib
+import functools
+
+if sys.platform.startswith(("win32", "cygwin", "msys")):
+    _LIB_PATTERNS = ("{}.dll", "lib{}.dll", "{}")
+elif sys.platform.startswith(("darwin", "ios")):
+    _LIB_PATTERNS = ("lib{}.dylib", "{}.dylib", "lib{}.so", "{}.so", "{}")
+else:  # assume unix pattern or plain name
+    _LIB_PATTERNS = ("lib{}.so", "{}.so", "{}")
+
+@functools.lru_cache(maxsize=None)
+def _find_system_library(name):
+    # ctypes.util.find_library() may spawn subprocesses, so only do this once per name
+    return ctypes.util.find_library(name)
+
+@functools.lru_cache(maxsize=None)
+def _resolve_reldir(dir, modpath):
+    return os.path.realpath(os.path.join(os.path.dirname(modpath), dir))
 
 def _find_library(name, dirs, search_sys):
+    # relative dirs are resolved against the module's location, so it needs to be part of the cache key
+    return _find_library_cached(name, tuple(dirs), search_sys, globals().get("__file__"))
+
+@functools.lru_cache(maxsize=None)
+def _find_library_cached(name, dirs, search_sys, modpath):
     
-    if sys.platform.startswith(("win32", "cygwin", "msys")):
-        patterns = ["{}.dll", "lib{}.dll", "{}"]
-    elif sys.platform.startswith(("darwin", "ios")):
-        patterns = ["lib{}.dylib", "{}.dylib", "lib{}.so", "{}.so", "{}"]
-    else:  # assume unix pattern or plain name
-        patterns = ["lib{}.so", "{}.so", "{}"]
+    libnames = [pat.format(name) for pat in _LIB_PATTERNS]
     
     for dir in dirs:
-        dir = pathlib.Path(dir)
-        if not dir.is_absolute():
-            dir = (pathlib.Path(__file__).parent / dir).resolve(strict=False)
-        for pat in patterns:
-            libpath = dir / pat.format(name)
-            if libpath.is_file():
-                return str(libpath)
+        if not os.path.isabs(dir):
+            dir = _resolve_reldir(dir, modpath)
+        for libname in libnames:
+            libpath = os.path.join(dir, libname)
+            if os.path.isfile(libpath):
+                return libpath
     
-    libpath = ctypes.util.find_library(name) if search_sys else None
+    libpath = _find_system_library(name) if search_sys else None
     if not libpath:
         raise ImportError(f"Could not find library '{name}' (dirs={dirs}, search_sys={search_sys})")
     
     return libpath
 
-_libs_info, _libs = {}, {}
+_libs_info, _libs, _lib_handles = {}, {}, {}
 
-def _register_library(name, dllclass, **kwargs):
+def _register_library(name, dllclass, mode=ctypes.DEFAULT_MODE, **kwargs):
+    # mode is passed through to dlopen(), e.g. os.RTLD_LAZY to defer symbol resolution until first use
+    if name in _libs:
+        return
     libpath = _find_library(name, **kwargs)
     _libs_info[name] = {**kwargs, "path": libpath}
-    _libs[name] = dllclass(libpath)
+    # share handles between names that resolve to the same file (e.g. through symlinks)
+    # system libraries may be given as bare names, which must not be resolved against the cwd
+    key = (dllclass, mode, os.path.realpath(libpath) if os.path.isabs(libpath) else libpath)
+    if key not in _lib_handles:
+        _lib_handles[key] = dllclass(libpath, mode=mode)
+    _libs[name] = _lib_handles[key]
@@ -10,6 +10,8 @@ is not C-specific. The other modules don't need to touch these.
 
 
 class Declaration:
+    __slots__ = ("declarator", "type", "storage", "attrib")
+
     def __init__(self):
         self.declarator = None
         self.type = Type()
@@ -25,6 +27,7 @@ class Declaration:
 
 
 class Declarator:
+    __slots__ = ("identifier", "initializer", "array", "parameters", "bitfield", "attrib")
     pointer = None
 
     def __init__(self):
@@ -52,11 +55,12 @@ class Declarator:
 
 
 class Pointer(Declarator):
-    pointer = None
+    __slots__ = ("qualifiers", "pointer")
 
     def __init__(self):
         super().__init__()
         self.qualifiers = []
+        self.pointer = None
 
     def __repr__(self):
         q = ""
@@ -66,22 +70,25 @@ class Pointer(Declarator):
 
 
 class Array:
+    __slots__ = ("size", "array")
+
     def __init__(self):
         self.size = None
         self.array = None
 
     def __repr__(self):
-        if self.size:
-            a = f"[{self.size!r}]"
-        else:
-            a = "[]"
-        if self.array:
-            return repr(self.array) + a
-        else:
-            return a
+        # nested arrays are printed innermost first
+        dims = []
+        a = self
+        while a:
+            dims.append(f"[{a.size!r}]" if a.size else "[]")
+            a = a.array
+        return "".join(reversed(dims))
 
 
 class Parameter:
+    __slots__ = ("type", "storage", "declarator", "attrib")
+
     def __init__(self):
         self.type = Type()
         self.storage = None
@@ -99,6 +106,8 @@ class Parameter:
 
 
 class Type:
+    __slots__ = ("qualifiers", "specifiers")
+
     def __init__(self):
         self.qualifiers = []
         self.specifiers = []
@@ -110,14 +119,33 @@ class Type:
 # These are used only internally.
 
 
-class StorageClassSpecifier(str):
-    def __repr__(self):
-        return f"StorageClassSpecifier({self})"
+class _PooledStr(str):
+    # Specifiers and qualifiers come from a small set of keywords and type names, so share one
+    # instance per value instead of creating a new one for every token.
+    # As there are only few instances, we can also afford to store the repr on them.
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._pool = {}
+
+    def __new__(cls, value):
+        try:
+            return cls._pool[value]
+        except KeyError:
+            obj = cls._pool[value] = super().__new__(cls, value)
+            obj._repr = f"{cls.__name__}({value})"
+            return obj
 
-class TypeSpecifier(str):
     def __repr__(self):
-        return f"TypeSpecifier({self})"
+        return self._repr
+
+
+class StorageClassSpecifier(_PooledStr):
+    pass
+
+
+class TypeSpecifier(_PooledStr):
+    pass
 
 
 class StructTypeSpecifier:
@@ -134,12 +162,12 @@ class StructTypeSpecifier:
         if self.attrib:
             attrs = list()
             for attr, val in self.attrib.items():
-                if val and type(val) == str:
+                if val and type(val) is str:
                     attrs.append(f"{attr}({val})")
                 elif val:
                     attrs.append(attr)
             s += " __attribute__((%s))" % ",".join(attrs)
-        if self.tag and type(self.tag) != int:
+        if self.tag and type(self.tag) is not int:
             s += f" {self.tag}"
         if self.declarations:
             s += " {%s}" % "; ".join([repr(d) for d in self.declarations])
@@ -174,9 +202,8 @@ class Enumerator:
         return s
 
 
-class TypeQualifier(str):
-    def __repr__(self):
-        return f"TypeQualifier({self})"
+class TypeQualifier(_PooledStr):
+    pass
 
 
 class PragmaPack:
@@ -213,7 +240,7 @@ class PragmaPack:
 
             if i >= 0:
                 item = self.stack[i]
-                self.stack = self.stack[:i]
+                del self.stack[i:]
             else:
                 err = f"encountered #pragma pack(pop, {id}) without matching #pragma pack(push, {id}); popped last"
 
@@ -228,13 +255,16 @@ pragma_pack = PragmaPack()
 
 
 class Attrib(dict):
+    __slots__ = ()
+
     def __init__(self, *a, **kw):
         if pragma_pack.current:
             super().__init__(packed=True, aligned=[pragma_pack.current])
             super().update(*a, **kw)
         else:
             super().__init__(*a, **kw)
-        self._unalias()
+        if a or kw:  # nothing to unalias otherwise
+            self._unalias()
 
     def __repr__(self):
         return f"Attrib({dict(self)})"
@@ -253,24 +283,41 @@ class Attrib(dict):
         """
 
         self.pop(None, None)  # remove dummy empty attribute
+        if not self:
+            return  # the common case
 
         fixes = [attr for attr in self if attr.startswith("__") and attr.endswith("__")]
         for attr in fixes:
             self[attr[2 : (len(attr) - 2)]] = self.pop(attr)
 
 
+def _apply_storage(declaration, s):
+    # Multiple storage classes, technically an error... ignore it
+    declaration.storage = s
+
+def _apply_type_specifier(declaration, s):
+    declaration.type.specifiers.append(s)
+
+def _apply_type_qualifier(declaration, s):
+    declaration.type.qualifiers.append(s)
+
+def _apply_attrib(declaration, s):
+    declaration.attrib.update(s)
+
+_SPECIFIER_APPLIERS = {
+    StorageClassSpecifier: _apply_storage,
+    TypeSpecifier: _apply_type_specifier,
+    StructTypeSpecifier: _apply_type_specifier,
+    EnumSpecifier: _apply_type_specifier,
+    TypeQualifier: _apply_type_qualifier,
+    Attrib: _apply_attrib,
+}
+
+
 def apply_specifiers(specifiers, declaration):
     """Apply specifiers to the declaration (declaration may be
     a Parameter instead)."""
     for s in specifiers:
-        if type(s) == StorageClassSpecifier:
-            if declaration.storage:
-                # Multiple storage classes, technically an error... ignore it
-                pass
-            declaration.storage = s
-        elif type(s) in (TypeSpecifier, StructTypeSpecifier, EnumSpecifier):
-            declaration.type.specifiers.append(s)
-        elif type(s) == TypeQualifier:
-            declaration.type.qualifiers.append(s)
-        elif type(s) == Attrib:
-            declaration.attrib.update(s)
+        applier = _SPECIFIER_APPLIERS.get(type(s))
+        if applier:
+            applier(declaration, s)
@@ -638,7 +638,7 @@ def p_declaration_specifier_list(p):
     """ declaration_specifier_list : gcc_attributes declaration_specifier gcc_attributes
                                    | declaration_specifier_list declaration_specifier gcc_attributes
     """
-    if type(p[1]) == cdeclarations.Attrib:
+    if type(p[1]) is cdeclarations.Attrib:
         p[0] = (p[1], p[2], p[3])
         p.slice[0].filename = p.slice[2].filename
         p.slice[0].lineno = p.slice[2].lineno
@@ -826,7 +826,7 @@ def p_specifier_qualifier_list(p):
     """ specifier_qualifier_list : gcc_attributes specifier_qualifier gcc_attributes
                                  | specifier_qualifier_list specifier_qualifier gcc_attributes
     """
-    if type(p[1]) == cdeclarations.Attrib:
+    if type(p[1]) is cdeclarations.Attrib:
         p[0] = (p[1], p[2], p[3])
     else:
         p[0] = p[1] + (p[2], p[3])
@@ -1093,7 +1093,7 @@ def p_abstract_declarator(p):
         while ptr.pointer:
             ptr = ptr.pointer
         # Only if doesn't already terminate in a declarator
-        if type(ptr) == cdeclarations.Pointer:
+        if type(ptr) is cdeclarations.Pointer:
             ptr.pointer = cdeclarations.Declarator()
             ptr.pointer.attrib.update(p[1].attrib)
         else:
@@ -106,16 +106,19 @@ class CParser:
         if sys.platform == "win32" and options.add_python_types:
             self.lexer.type_names.add("__int64")
 
-    def parse(self, filename, debug=False):
+    def parse(self, filename, debug=False, input=None):
         """Parse a file.
 
         If `debug` is True, parsing state is dumped to stdout.
+        If `input` (bytes) is given, it is passed to the preprocessor's stdin instead of reading
+        a file, and `filename` should be "-".
         """
 
-        self.handle_status(f"Preprocessing {filename}")
-        self.preprocessor_parser.parse(filename)
+        name = filename if input is None else "<stdin>"
+        self.handle_status(f"Preprocessing {name}")
+        self.preprocessor_parser.parse(filename, input)
         self.lexer.input(self.preprocessor_parser.output)
-        self.handle_status(f"Parsing {filename}")
+        self.handle_status(f"Parsing {name}")
         self.parser.parse(lexer=self.lexer, debug=debug, tracking=True)
 
     # ----------------------------------------------------------------------
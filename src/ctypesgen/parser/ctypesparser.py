@@ -19,7 +19,7 @@ from ctypesgen.ctypedescs import (
     CtypesTypedef,
     CtypesSpecial,
     ctypes_type_map,
-    ctypes_type_map_python_builtin,
+    ctypes_type_map_full,
     remove_function_pointer,
 )
 from ctypesgen.expressions import (
@@ -30,12 +30,23 @@ from ctypesgen.expressions import (
 from ctypesgen.parser.cdeclarations import (
     Attrib,
     EnumSpecifier,
-    Pointer,
     StructTypeSpecifier,
+    TypeSpecifier,
 )
 from ctypesgen.parser.cparser import CParser
 
 
+_SIGNED, _UNSIGNED, _LONG, _SHORT = (TypeSpecifier(s) for s in ("signed", "unsigned", "long", "short"))
+
+# expression nodes aren't modified after construction, so constants can be shared
+_CONST_ZERO = ConstantExpressionNode(0)
+_CONST_ONE = ConstantExpressionNode(1)
+
+
+def _add(x, y):
+    return x + y
+
+
 def make_enum_from_specifier(specifier):
     tag = specifier.tag
     
@@ -48,14 +59,14 @@ def make_enum_from_specifier(specifier):
             if last_name:
                 value = BinaryExpressionNode(
                     "addition",
-                    (lambda x, y: x + y),
+                    _add,
                     "(%s + %s)",
                     (False, False),
                     IdentifierExpressionNode(last_name),
-                    ConstantExpressionNode(1),
+                    _CONST_ONE,
                 )
             else:
-                value = ConstantExpressionNode(0)
+                value = _CONST_ZERO
         
         enumerators.append((e.name, value))
         last_name = e.name
@@ -63,14 +74,12 @@ def make_enum_from_specifier(specifier):
     return CtypesEnum(tag, enumerators, src=(specifier.filename, specifier.lineno))
 
 
-def get_decl_id(decl):
-    """Return the identifier of a given declarator"""
-    while isinstance(decl, Pointer):
-        decl = decl.pointer
-    p_name = ""
-    if decl is not None and decl.identifier is not None:
-        p_name = decl.identifier
-    return p_name
+def wrap_arrays(t, array):
+    """Wrap a ctype in the dimensions of a (possibly nested) array declarator"""
+    while array:
+        t = CtypesArray(t, array.size)
+        array = array.array
+    return t
 
 
 class CtypesParser(CParser):
@@ -82,9 +91,12 @@ class CtypesParser(CParser):
     def __init__(self, options):
         super().__init__(options)
         self.options = options
-        self.type_map = ctypes_type_map
+        # don't update ctypes_type_map in place, it is shared across runs
         if self.options.add_python_types:
-            self.type_map.update(ctypes_type_map_python_builtin)
+            self.type_map = ctypes_type_map_full
+        else:
+            self.type_map = ctypes_type_map
+        self._typenames = frozenset(k[0] for k in self.type_map)
     
     def make_struct_from_specifier(self, specifier):
         
@@ -96,23 +108,20 @@ class CtypesParser(CParser):
         if specifier.declarations:
             members = []
             for declaration in specifier.declarations:
-                declarator = declaration.declarator
-                t = self.get_ctypes_type(
-                    declaration.type, declarator, check_qualifiers=True
+                t, declarator = self._get_ctypes_type_and_decl(
+                    declaration.type, declaration.declarator, check_qualifiers=True
                 )
                 if declarator is None:
                     # Anonymous field in nested union/struct (C11/GCC).
                     name = None
                 else:
-                    while declarator.pointer:
-                        declarator = declarator.pointer
                     name = declarator.identifier
                 members.append((name, remove_function_pointer(t)))
             
             # handle FAM (flexible array member) at end of struct as zero-sized array (see GH issue #219)
             _, last_ctype = members[-1]
             if isinstance(last_ctype, CtypesArray) and last_ctype.count is None:
-                last_ctype.count = ConstantExpressionNode(0)
+                last_ctype.count = _CONST_ZERO
         
         else:
             members = None
@@ -122,23 +131,30 @@ class CtypesParser(CParser):
         )
 
     def get_ctypes_type(self, typ, declarator, check_qualifiers=False):
+        return self._get_ctypes_type_and_decl(typ, declarator, check_qualifiers)[0]
+    
+    def _get_ctypes_type_and_decl(self, typ, declarator, check_qualifiers=False):
+        # Returns the ctype and the innermost declarator, which holds the identifier.
+        # We walk the pointer chain anyway, so callers needn't do it again.
         signed = True
         typename = "int"
         longs = 0
         t = None
         
+        # type specifiers are pooled, so we can compare by identity
         for specifier in typ.specifiers:
-            if isinstance(specifier, StructTypeSpecifier):
+            spec_type = type(specifier)
+            if spec_type is StructTypeSpecifier:
                 t = self.make_struct_from_specifier(specifier)
-            elif isinstance(specifier, EnumSpecifier):
+            elif spec_type is EnumSpecifier:
                 t = make_enum_from_specifier(specifier)
-            elif specifier == "signed":
+            elif specifier is _SIGNED:
                 signed = True
-            elif specifier == "unsigned":
+            elif specifier is _UNSIGNED:
                 signed = False
-            elif specifier == "long":
+            elif specifier is _LONG:
                 longs += 1
-            elif specifier == "short":
+            elif specifier is _SHORT:
                 longs = -1
             else:
                 typename = str(specifier)
@@ -153,7 +169,7 @@ class CtypesParser(CParser):
             
             else:
                 name = " ".join(typ.specifiers)
-                if typename in [x[0] for x in self.type_map.keys()]:
+                if typename in self._typenames:
                     # It's an unsupported variant of a builtin type
                     error = f"Ctypes does not support the type '{name}'."
                 else:
@@ -168,44 +184,21 @@ class CtypesParser(CParser):
         qualifiers.extend(typ.qualifiers)
         while declarator and declarator.pointer:
             if declarator.parameters is not None:
-                variadic = "..." in declarator.parameters
-                
-                params = []
-                for param in declarator.parameters:
-                    if param == "...":
-                        break
-                    param_name = get_decl_id(param.declarator)
-                    ct = self.get_ctypes_type(param.type, param.declarator)
-                    ct.identifier = param_name
-                    params.append(ct)
+                params, variadic = self._get_params(declarator.parameters)
                 t = CtypesFunction(t, params, variadic, self.options)
             
-            a = declarator.array
-            while a:
-                t = CtypesArray(t, a.size)
-                a = a.array
+            t = wrap_arrays(t, declarator.array)
             
             qualifiers.extend(declarator.qualifiers)
             t = CtypesPointer(t, tuple(typ.qualifiers) + tuple(declarator.qualifiers))
             declarator = declarator.pointer
         
         if declarator and declarator.parameters is not None:
-            variadic = "..." in declarator.parameters
-            params = []
-            for param in declarator.parameters:
-                if param == "...":
-                    break
-                param_name = get_decl_id(param.declarator)
-                ct = self.get_ctypes_type(param.type, param.declarator)
-                ct.identifier = param_name
-                params.append(ct)
+            params, variadic = self._get_params(declarator.parameters)
             t = CtypesFunction(t, params, variadic, self.options, declarator.attrib)
         
         if declarator:
-            a = declarator.array
-            while a:
-                t = CtypesArray(t, a.size)
-                a = a.array
+            t = wrap_arrays(t, declarator.array)
         
         if (
             self.options.string_template
@@ -217,24 +210,34 @@ class CtypesParser(CParser):
             elif t.destination.name == "wchar_t":
                 t = CtypesSpecial("WideString")
         
-        return t
+        return t, declarator
+    
+    def _get_params(self, parameters):
+        # "..." can only be the last parameter
+        params = []
+        variadic = False
+        for param in parameters:
+            if param == "...":
+                variadic = True
+                break
+            ct, param_decl = self._get_ctypes_type_and_decl(param.type, param.declarator)
+            ct.identifier = param_decl.identifier if param_decl and param_decl.identifier else ""
+            params.append(ct)
+        return params, variadic
     
     def handle_declaration(self, declaration, filename, lineno):
-        t = self.get_ctypes_type(declaration.type, declaration.declarator)
+        t, declarator = self._get_ctypes_type_and_decl(declaration.type, declaration.declarator)
         
         if type(t) in (CtypesStruct, CtypesEnum):
             self.handle_ctypes_new_type(remove_function_pointer(t), filename, lineno)
         
-        declarator = declaration.declarator
         if declarator is None:
             # XXX TEMPORARY while struct with no typedef not filled in
             return
-        while declarator.pointer:
-            declarator = declarator.pointer
         name = declarator.identifier
         if declaration.storage == "typedef":
             self.handle_ctypes_typedef(name, remove_function_pointer(t), filename, lineno)
-        elif type(t) == CtypesFunction:
+        elif type(t) is CtypesFunction:
             attrib = Attrib(t.attrib)
             attrib.update(declaration.attrib)
             self.handle_ctypes_function(
@@ -5,10 +5,9 @@ After parsing is complete, a DescriptionCollection object can be retrieved by
 calling DataCollectingParser.data().
 """
 
-import os
-from tempfile import mkstemp
+import sys
 
-from ctypesgen.ctypedescs import CtypesEnum, CtypesType, CtypesTypeVisitor
+from ctypesgen.ctypedescs import CtypesEnum, CtypesStruct, CtypesType, CtypesTypeVisitor
 from ctypesgen.descriptions import (
     ConstantDescription,
     DescriptionCollection,
@@ -49,13 +48,20 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         
         self.all = []
         self.output_order = []
+        self._buckets = {
+            "constant": self.constants,
+            "typedef": self.typedefs,
+            "struct": self.structs,
+            "enum": self.enums,
+            "function": self.functions,
+            "variable": self.variables,
+            "macro": self.macros,
+        }
         
         # NULL is a useful macro to have defined
         null = ConstantExpressionNode(None)
         nullmacro = ConstantDescription("NULL", null, ("<built-in>", 1))
-        self.constants.append(nullmacro)
-        self.all.append(nullmacro)
-        self.output_order.append(("constant", nullmacro))
+        self._emit("constant", nullmacro)
         
         # A list of tuples describing macros; saved to be processed after
         # everything else has been parsed
@@ -68,20 +74,17 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         self.already_seen_enums = set()
         # A dict of enums that have only been seen in opaque form
         self.already_seen_opaque_enums = {}
+        # A dict of (filename, lineno) to shared src tuples
+        self._src_pool = {}
+        # A set of ctypes we have already visited (identity-hashed)
+        self.already_visited_ctypes = set()
     
     def parse(self):
-        fd, fname = mkstemp(suffix=".h")
-        with os.fdopen(fd, "w") as f:
-            for header in self.options.system_headers:
-                f.write(f"#include <{header}>\n")
-            for header in self.headers:
-                # self.headers: list of resolved Path objects
-                f.write(f'#include "{header}"\n')
-            f.flush()
-        try:
-            super().parse(fname, self.options.debug_level)
-        finally:
-            os.unlink(fname)
+        # pass the includes to the preprocessor via stdin, so we don't need a temporary file
+        includes = [f"#include <{header}>\n" for header in self.options.system_headers]
+        # self.headers: list of resolved Path objects
+        includes += [f'#include "{header}"\n' for header in self.headers]
+        super().parse("-", self.options.debug_level, input="".join(includes).encode("utf-8"))
 
         for name, params, expr, (filename, lineno) in self.saved_macros:
             self.handle_macro(name, params, expr, filename, lineno)
@@ -100,9 +103,7 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         macro = MacroDescription(name, params, None, src=(filename, lineno))
         macro.error(f"Could not parse macro '{original_string}'", cls="macro")
         macro.original_string = original_string
-        self.macros.append(macro)
-        self.all.append(macro)
-        self.output_order.append(("macro", macro))
+        self._emit("macro", macro)
     
     def handle_define_macro(self, name, params, expr, filename, lineno):
         # Called by CParser
@@ -113,13 +114,47 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         # save to handle later to get order correct
         self.saved_macros.append(("#undef", None, macro, (filename, lineno)))
     
+    def _src(self, filename, lineno):
+        # Many descriptions share a source file, and some also a line, so pool the src tuples and intern the filenames.
+        key = (filename, lineno)
+        src = self._src_pool.get(key)
+        if src is None:
+            if type(filename) is str:  # may be None for some synthesized types
+                filename = sys.intern(filename)
+            src = self._src_pool[key] = (filename, str(lineno))
+        return src
+    
+    def _emit(self, kind, desc):
+        self._buckets[kind].append(desc)
+        self.all.append(desc)
+        self.output_order.append((kind, desc))
+    
+    def _visit(self, ctype):
+        # Visiting a ctype only registers the structs and enums it contains, so doing it again for the same object is redundant.
+        # This commonly happens with e.g. "typedef struct {...} name;", where the struct has been visited as new type already.
+        # Walk the type tree with an explicit stack, in the same (pre-)order as CtypesType.visit(). As we only handle structs and enums, the other visitor hooks are skipped.
+        seen = self.already_visited_ctypes
+        stack = [ctype]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            if not isinstance(node, CtypesType):
+                node.visit(self)  # expression node, e.g. an array count
+                continue
+            node_type = type(node)
+            if node_type is CtypesStruct:
+                self.visit_struct(node)
+            elif node_type is CtypesEnum:
+                self.visit_enum(node)
+            stack.extend(reversed(node.children()))
+    
     def handle_ctypes_typedef(self, name, ctype, filename, lineno):
         # Called by CtypesParser
-        ctype.visit(self)
-        typedef = TypedefDescription(name, ctype, src=(filename, repr(lineno)))
-        self.typedefs.append(typedef)
-        self.all.append(typedef)
-        self.output_order.append(("typedef", typedef))
+        self._visit(ctype)
+        typedef = TypedefDescription(name, ctype, src=self._src(filename, lineno))
+        self._emit("typedef", typedef)
 
     def handle_ctypes_new_type(self, ctype, filename, lineno):
         # Called by CtypesParser
@@ -132,25 +167,21 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         self, name, restype, argtypes, errcheck, variadic, attrib, filename, lineno
     ):
         # Called by CtypesParser
-        restype.visit(self)
+        self._visit(restype)
         for argtype in argtypes:
-            argtype.visit(self)
+            self._visit(argtype)
         
         function = FunctionDescription(
-            name, restype, argtypes, errcheck, variadic, attrib, src=(filename, repr(lineno))
+            name, restype, argtypes, errcheck, variadic, attrib, src=self._src(filename, lineno)
         )
         
-        self.functions.append(function)
-        self.all.append(function)
-        self.output_order.append(("function", function))
+        self._emit("function", function)
     
     def handle_ctypes_variable(self, name, ctype, filename, lineno):
         # Called by CtypesParser
-        ctype.visit(self)
-        variable = VariableDescription(name, ctype, src=(filename, repr(lineno)))
-        self.variables.append(variable)
-        self.all.append(variable)
-        self.output_order.append(("variable", variable))
+        self._visit(ctype)
+        variable = VariableDescription(name, ctype, src=self._src(filename, lineno))
+        self._emit("variable", variable)
 
     def handle_struct(self, ctypestruct, filename, lineno):
         # Called from within DataCollectingParser
@@ -162,12 +193,12 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         # append the fields body to the outputs, and remove the opaque
         # struct from the record
         
-        name = f"{ctypestruct.variety} {ctypestruct.tag}"
-        if name in self.already_seen_structs:
+        key = (ctypestruct.variety, ctypestruct.tag)
+        if key in self.already_seen_structs:
             return
         
         if ctypestruct.opaque:
-            if name not in self.already_seen_opaque_structs:
+            if key not in self.already_seen_opaque_structs:
                 struct = StructDescription(
                     ctypestruct.tag,
                     ctypestruct.attrib,
@@ -175,27 +206,25 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
                     None,  # No members
                     True,  # Opaque
                     ctypestruct,
-                    src=(filename, str(lineno)),
+                    src=self._src(filename, lineno),
                 )
                 
-                self.already_seen_opaque_structs[name] = struct
-                self.structs.append(struct)
-                self.all.append(struct)
-                self.output_order.append(("struct", struct))
+                self.already_seen_opaque_structs[key] = struct
+                self._emit("struct", struct)
         
         else:
             for membername, ctype in ctypestruct.members:
-                ctype.visit(self)
+                self._visit(ctype)
             
-            if name in self.already_seen_opaque_structs:
+            if key in self.already_seen_opaque_structs:
                 # Fill in older version
-                struct = self.already_seen_opaque_structs[name]
+                struct = self.already_seen_opaque_structs[key]
                 struct.opaque = False
                 struct.members = ctypestruct.members
                 struct.ctype = ctypestruct
                 struct.src = ctypestruct.src
                 self.output_order.append(("struct_fields", struct))
-                del self.already_seen_opaque_structs[name]
+                del self.already_seen_opaque_structs[key]
             
             else:
                 struct = StructDescription(
@@ -204,15 +233,13 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
                     ctypestruct.variety,
                     ctypestruct.members,
                     False,  # Not opaque
-                    src=(filename, str(lineno)),
+                    src=self._src(filename, lineno),
                     ctype=ctypestruct,
                 )
-                self.structs.append(struct)
-                self.all.append(struct)
-                self.output_order.append(("struct", struct))
+                self._emit("struct", struct)
                 self.output_order.append(("struct_fields", struct))
             
-            self.already_seen_structs.add(name)
+            self.already_seen_structs.add(key)
     
     def handle_enum(self, ctypeenum, filename, lineno):
         # Called from within DataCollectingParser.
@@ -226,13 +253,11 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         
         if ctypeenum.opaque:
             if tag not in self.already_seen_opaque_enums:
-                enum = EnumDescription(ctypeenum.tag, None, ctypeenum, src=(filename, str(lineno)))
+                enum = EnumDescription(ctypeenum.tag, None, ctypeenum, src=self._src(filename, lineno))
                 enum.opaque = True
                 
                 self.already_seen_opaque_enums[tag] = enum
-                self.enums.append(enum)
-                self.all.append(enum)
-                self.output_order.append(("enum", enum))
+                self._emit("enum", enum)
         
         else:
             if tag in self.already_seen_opaque_enums:
@@ -248,21 +273,17 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
                 enum = EnumDescription(
                     ctypeenum.tag,
                     ctypeenum.enumerators,
-                    src=(filename, str(lineno)),
+                    src=self._src(filename, lineno),
                     ctype=ctypeenum,
                 )
                 enum.opaque = False
-                self.enums.append(enum)
-                self.all.append(enum)
-                self.output_order.append(("enum", enum))
+                self._emit("enum", enum)
             
             self.already_seen_enums.add(tag)
             
             for enumname, expr in ctypeenum.enumerators:
                 constant = ConstantDescription(enumname, expr, src=(filename, lineno))
-                self.constants.append(constant)
-                self.all.append(constant)
-                self.output_order.append(("constant", constant))
+                self._emit("constant", constant)
     
     def handle_macro(self, name, params, expr, filename, lineno):
         # Called from within DataCollectingParser
@@ -278,7 +299,9 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
         if type(expr) is Attrib:
             return
         
-        expr.visit(self)
+        # Visiting registers the structs and enums an expression refers to, which constants (the most common case) and the identifiers of #undef can't contain
+        if not (type(expr) is ConstantExpressionNode or name == "#undef"):
+            expr.visit(self)
         
         if isinstance(expr, CtypesType):
             if params:
@@ -287,15 +310,11 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
                     f"{macro.casual_name()} has parameters but evaluates to a type. Ctypesgen does not support it.",
                     cls="macro",
                 )
-                self.macros.append(macro)
-                self.all.append(macro)
-                self.output_order.append(("macro", macro))
+                self._emit("macro", macro)
             
             else:
                 typedef = TypedefDescription(name, expr, src)
-                self.typedefs.append(typedef)
-                self.all.append(typedef)
-                self.output_order.append(("typedef", typedef))
+                self._emit("typedef", typedef)
         
         elif name == "#undef":
             undef = UndefDescription(expr, src)
@@ -303,9 +322,7 @@ class DataCollectingParser(ctypesparser.CtypesParser, CtypesTypeVisitor):
             self.output_order.append(("undef", undef))
         else:
             macro = MacroDescription(name, params, expr, src)
-            self.macros.append(macro)
-            self.all.append(macro)
-            self.output_order.append(("macro", macro))
+            self._emit("macro", macro)
         
         # Macros could possibly contain things like __FILE__, __LINE__, etc...
         # This could be supported, but it would be a lot of work and require a considerable amount of templates
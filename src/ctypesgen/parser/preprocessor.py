@@ -5,10 +5,13 @@ Reference is C99:
   * http://www.open-std.org/JTC1/SC22/WG14/www/docs/n1124.pdf
 """
 
-# import re
+import os
+import re
 import sys
-import copy
+import json
 import shlex
+import shutil
+import hashlib
 import subprocess
 from pathlib import Path
 
@@ -49,12 +52,80 @@ class PreprocessorLexer(lex.Lexer):
         return result
 
 
+# --------------------------------------------------------------------------
+# Preprocessor output cache
+# --------------------------------------------------------------------------
+
+
+class _PreprocCache:
+    """
+    Cache of preprocessor output, keyed by command and input content.
+    The files included during preprocessing are taken from the line markers in the output. Their
+    mtimes are stored along with the output, and an entry is only used if none of them changed.
+    """
+    
+    # line markers look like '# 1 "/usr/include/stdio.h" 1 3 4'; skip pseudo-files like <built-in>
+    # backslashes and quotes in the path are escaped
+    _LINEMARKER_RE = re.compile(rb'^# \d+ "([^"<](?:[^"\\]|\\.)*)"', flags=re.MULTILINE)
+    _UNESCAPE_RE = re.compile(rb"\\(.)")
+    # environment variables that influence the include search path
+    _ENV_VARS = ("CPATH", "C_INCLUDE_PATH", "CPLUS_INCLUDE_PATH", "OBJC_INCLUDE_PATH")
+    
+    def __init__(self, cachedir, cmd, filename, input):
+        self.filename = filename
+        # Hash the input content rather than relying on the file path (the input is commonly a
+        # generated header that includes the actual headers). Include the compiler's mtime to notice updates.
+        hasher = hashlib.blake2b(digest_size=20)
+        key = {
+            "cmd": [str(c) for c in cmd if c != filename],
+            "cpp_mtime": _get_mtime(shutil.which(cmd[0]) or cmd[0]),
+            "env": {k: os.environ.get(k) for k in self._ENV_VARS},
+        }
+        hasher.update(json.dumps(key).encode())
+        hasher.update(input if input is not None else Path(filename).read_bytes())
+        cachedir.mkdir(parents=True, exist_ok=True)
+        self.path = cachedir / f"{hasher.hexdigest()}.i"
+        self.deps_path = self.path.with_suffix(".json")
+    
+    def load(self):
+        if not (self.path.exists() and self.deps_path.exists()):
+            return None
+        deps = json.loads(self.deps_path.read_text())
+        if any(_get_mtime(p) != m for p, m in deps.items()):
+            return None
+        return self.path.read_bytes()
+    
+    def store(self, output):
+        paths = {os.fsdecode(self._UNESCAPE_RE.sub(rb"\1", p)) for p in self._LINEMARKER_RE.findall(output)}
+        paths.discard(self.filename)
+        deps = {p: _get_mtime(p) for p in paths}
+        if None in deps.values():
+            warning_message("Could not determine all included files, won't cache preprocessor output.")
+            return
+        # write to temporary files and move them in place, so a concurrent run never sees a partial entry
+        # the output goes last, as load() requires both files
+        for dest, content in ((self.deps_path, json.dumps(deps).encode()), (self.path, output)):
+            tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, dest)
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
 # --------------------------------------------------------------------------
 # Grammars
 # --------------------------------------------------------------------------
 
 
 class PreprocessorParser:
+    
+    _lexer_cache = {}
+    
     def __init__(self, options, cparser):
         self.options = options
         self.cparser = cparser  # An instance of CParser
@@ -84,13 +155,19 @@ class PreprocessorParser:
         
         self.matches = []
         self.output = []
-        self.lexer = lex.lex(
-            cls=PreprocessorLexer,
-            optimize=options.optimize_lexer,
-            lextab="lextab",
-            outputdir=str(Path(__file__).parent),
-            module=pplexer,
-        )
+        
+        # Building the lexer is fairly expensive, so keep a pristine instance per mode and hand out clones, which share the compiled tables but have their own state.
+        key = bool(options.optimize_lexer)
+        master = self._lexer_cache.get(key)
+        if master is None:
+            master = self._lexer_cache[key] = lex.lex(
+                cls=PreprocessorLexer,
+                optimize=key,
+                lextab="lextab",
+                outputdir=str(Path(__file__).parent),
+                module=pplexer,
+            )
+        self.lexer = master.clone()
     
     
     def _get_default_flags(self):
@@ -100,7 +177,8 @@ class PreprocessorParser:
         elif not self.options.no_default_cppflags:
             return {}
         
-        flags_dict = copy.deepcopy(self.default_flags)
+        # values are flat dicts or lists of strings, so a shallow copy of each suffices
+        flags_dict = {k: v.copy() for k, v in self.default_flags.items()}
         crossout = self.options.no_default_cppflags
         for params in flags_dict.values():
             deletor = params.pop if isinstance(params, dict) else params.remove
@@ -120,24 +198,14 @@ class PreprocessorParser:
         for flag, params in flags_dict.items():
             if isinstance(params, dict):
                 params = [f"{k}={v}" for k, v in params.items()]
-            for p in params:
-                serialized += [flag, p]
+            serialized += [x for p in params for x in (flag, p)]
         return serialized
     
     
-    def parse(self, filename):
-        """Parse a file and save its output"""
-        
-        cmd = [*self.options.cpp, filename, "-dD"]
-        flags_dict = self._get_default_flags()
-        cmd += self._serialize_flags_dict(flags_dict)
-        for p in self.options.include_search_paths:
-            cmd += ["-I", p]
-        cmd += self.options.cppargs
-        self.cparser.handle_status(' '.join([shlex.quote(c) for c in cmd]))
-        
+    def _run_cpp(self, cmd, input):
         pp = subprocess.run(
             cmd,
+            input=input,
             universal_newlines=False,  # binary
             stdout=subprocess.PIPE,
         )
@@ -147,15 +215,44 @@ class PreprocessorParser:
                 raise RuntimeError(msg)
             else:
                 warning_message(msg)
+        return pp.stdout, pp.returncode
+    
+    
+    def parse(self, filename, input=None):
+        """Parse a file and save its output.
+        If input (bytes) is given, it is passed to the preprocessor's stdin, so filename should be "-".
+        """
+        
+        cmd = [*self.options.cpp, filename, "-dD"]
+        flags_dict = self._get_default_flags()
+        cmd += self._serialize_flags_dict(flags_dict)
+        for p in self.options.include_search_paths:
+            cmd += ["-I", p]
+        cmd += self.options.cppargs
+        self.cparser.handle_status(' '.join([shlex.quote(c) for c in cmd]))
+        
+        cache = None
+        if self.options.preproc_cachedir:
+            cache = _PreprocCache(self.options.preproc_cachedir, cmd, filename, input)
+            pp_stdout = cache.load()
+            if pp_stdout is not None:
+                self.cparser.handle_status(f"Using cached preprocessor output {cache.path}")
+        if cache is None or pp_stdout is None:
+            pp_stdout, returncode = self._run_cpp(cmd, input)
+            # don't cache failed runs: e.g. a missing include isn't tracked as a dependency, so the entry would never be invalidated
+            if cache and returncode == 0:
+                cache.store(pp_stdout)
         
         if self.options.preproc_savepath:
             self.cparser.handle_status(f"Saving preprocessor output to {self.options.preproc_savepath}.")
-            self.options.preproc_savepath.write_bytes(pp.stdout)
+            self.options.preproc_savepath.write_bytes(pp_stdout)
         
         if IS_MAC:
-            ppout = pp.stdout.decode("utf-8", errors="replace")
+            ppout = pp_stdout.decode("utf-8", errors="replace")
         else:
-            ppout = pp.stdout.decode("utf-8")
+            ppout = pp_stdout.decode("utf-8")
+        # free the raw output before lexing, so we don't hold both the bytes and the text (and the tokens) at once
+        del pp_stdout
         
         if IS_WINDOWS:
             ppout = ppout.replace("\r\n", "\n")
@@ -206,12 +303,8 @@ class PreprocessorParser:
         self.output = []
         
         try:
-            while True:
-                token = self.lexer.token()
-                if token is not None:
-                    self.output.append(token)
-                else:
-                    break
+            # drive the lexer from C; on error, the tokens up to the offending one remain in the output
+            self.output.extend(iter(self.lexer.token, None))
         except LexError as e:
             # FIXME This will produce an incomplete output, any members after the offending line will be missing.
             # TODO If possible, skip past the error and continue lexing. In the meantime, we should at least propagate a non-zero return code in the end.
@@ -1,37 +1,130 @@
 import json
-from ctypesgen.ctypedescs import CtypesBitfield
+from ctypesgen.ctypedescs import CtypesBitfield, CtypesSimple, CtypesSpecial, CtypesTypedef
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# From:
-# http://stackoverflow.com/questions/1036409/recursively-convert-python-object-graph-to-dictionary
-def todict(obj, classkey="Klass"):
-    if isinstance(obj, dict):
-        for k in obj.keys():
-            obj[k] = todict(obj[k], classkey)
-        return obj
-    elif isinstance(obj, str) or isinstance(obj, bytes):
-        # must handle strings before __iter__
-        return obj
-    elif hasattr(obj, "__iter__"):
-        return [todict(v, classkey) for v in obj]
-    elif hasattr(obj, "__dict__"):
-        data = dict(
-            [
-                (key, todict(value, classkey))
-                for key, value in obj.__dict__.items()
-                if not callable(value) and not key.startswith("_")
-            ]
-        )
-        if classkey is not None and hasattr(obj, "__class__"):
-            data[classkey] = obj.__class__.__name__
+
+_slot_names = {}
+
+def _get_attrs(obj):
+    # ctypes and expression objects use __slots__, so collect these in addition to __dict__
+    attrs = dict(getattr(obj, "__dict__", {}))
+    cls = type(obj)
+    names = _slot_names.get(cls)
+    if names is None:
+        names = _slot_names[cls] = [k for c in cls.__mro__ for k in getattr(c, "__slots__", ())]
+    for key in names:
+        if key not in attrs and hasattr(obj, key):  # slots may be unset
+            attrs[key] = getattr(obj, key)
+    return attrs.items()
+
+
+# The conversion is iterative: each handler creates the container for its node right away and pushes the
+# non-leaf children onto the stack, along with the container and key their result is to be stored at.
+# This avoids a Python call (and frame) per nested node, and isn't bound by the recursion limit.
+
+_LEAF_TYPES = frozenset((str, bytes, int, float, bool, type(None)))
+
+def _push_items(out, items, stack):
+    for k, v in items:
+        if type(v) in _LEAF_TYPES:
+            out[k] = v
+        else:
+            out[k] = None  # placeholder, preserving the order of keys
+            stack.append((v, out, k))
+
+def _todict_identity(obj, classkey, memo, stack):
+    return obj
+
+def _todict_dict(obj, classkey, memo, stack):
+    out = {}
+    _push_items(out, obj.items(), stack)
+    return out
+
+def _todict_seq(obj, classkey, memo, stack):
+    out = [None] * len(obj)
+    _push_items(out, enumerate(obj), stack)
+    return out
+
+def _todict_object(obj, classkey, memo, stack):
+    # the same ctype instance may be referenced many times (e.g. typedefs or struct members), so convert it only once if given a memo
+    # the graph has no cycles, so it's fine to hand out the result before its children are filled in
+    if memo is not None:
+        data = memo.get(id(obj))
+        if data is not None:
+            return data
+    data = {}
+    _push_items(data, ((k, v) for k, v in _get_attrs(obj) if not k.startswith("_") and not callable(v)), stack)
+    if classkey is not None:
+        data[classkey] = type(obj).__name__
+    if memo is not None:
+        memo[id(obj)] = data
+    return data
+
+def _make_leaf_todict(cls):
+    # fast path for ctypes whose attributes are plain values (besides the errors list), avoiding the generic attribute walk
+    # the fields are taken from __slots__ along the MRO, so they can't get out of sync with the class
+    fields = tuple(k for c in cls.__mro__ for k in getattr(c, "__slots__", ()) if not k.startswith("_"))
+    def _todict_leaf(obj, classkey, memo, stack):
+        data = {}
+        for k in fields:
+            v = getattr(obj, k, _todict_leaf)  # slots may be unset
+            if v is _todict_leaf:
+                continue
+            elif type(v) in _LEAF_TYPES:
+                data[k] = v
+            else:
+                data[k] = None
+                stack.append((v, data, k))
+        if classkey is not None:
+            data[classkey] = type(obj).__name__
         return data
+    return _todict_leaf
+
+_TODICT_DISPATCH = {
+    **{cls: _make_leaf_todict(cls) for cls in (CtypesSimple, CtypesSpecial, CtypesTypedef)},
+    dict: _todict_dict,
+    list: _todict_seq,
+    tuple: _todict_seq,
+    set: _todict_seq,
+    **{t: _todict_identity for t in _LEAF_TYPES},
+}
+
+def _todict_fallback(obj, classkey, memo, stack):
+    # subclasses of the builtin types (e.g. the str-based type specifiers)
+    if isinstance(obj, (str, bytes)):
+        return obj
+    elif isinstance(obj, dict):
+        return _todict_dict(obj, classkey, memo, stack)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        return _todict_seq(obj, classkey, memo, stack)
+    elif hasattr(obj, "__dict__") or hasattr(obj, "__slots__"):
+        return _todict_object(obj, classkey, memo, stack)
     else:
         return obj
 
 
+# Originally from:
+# http://stackoverflow.com/questions/1036409/recursively-convert-python-object-graph-to-dictionary
+# Builds new containers rather than modifying the given ones in place.
+# memo is a dict mapping id(obj) -> result, which the caller must only use while the objects are alive.
+def todict(obj, classkey="Klass", memo=None):
+    root = [None]
+    stack = [(obj, root, 0)]
+    while stack:
+        obj, parent, key = stack.pop()
+        handler = _TODICT_DISPATCH.get(type(obj), _todict_fallback)
+        parent[key] = handler(obj, classkey, memo, stack)
+    return root[0]
+
+
 class WrapperPrinter:
     def __init__(self, outpath, options, data, argv):
         self.options = options
+        self._todict_memo = {}
         
         self.print_library(self.options.library)
         method_table = {
@@ -50,9 +143,26 @@ class WrapperPrinter:
         for kind, desc in data:
             item = method_table[kind](desc)
             if item: res.append(item)
-        with outpath.open("w", encoding="utf-8") as fh:
-            fh.write(json.dumps(res, sort_keys=True, indent=4))
-            fh.write("\n")
+        content = None
+        if orjson:
+            # much faster than the stdlib encoder, but only supports 2-space indentation
+            # known differences: orjson writes non-finite floats as null (the stdlib writes NaN/Infinity, which isn't valid JSON),
+            # and it can't encode integers wider than 64 bits, in which case we fall back to the stdlib encoder
+            try:
+                content = orjson.dumps(res, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2)
+            except orjson.JSONEncodeError:
+                pass
+        if content is not None:
+            outpath.write_bytes(content + b"\n")
+        else:
+            # stream into the file rather than building the whole string in memory
+            # same format as orjson's, so the output doesn't depend on whether it is installed
+            with outpath.open("w", encoding="utf-8") as fh:
+                json.dump(res, fh, sort_keys=True, indent=2, ensure_ascii=False)
+                fh.write("\n")
+    
+    def todict(self, obj):
+        return todict(obj, memo=self._todict_memo)
     
     def print_library(self, library):
         return {"load_library": library}
@@ -64,14 +174,14 @@ class WrapperPrinter:
         return {"type": "undef", "value": undef.macro.py_string(False)}
     
     def print_typedef(self, typedef):
-        return {"type": "typedef", "name": typedef.name, "ctype": todict(typedef.ctype)}
+        return {"type": "typedef", "name": typedef.name, "ctype": self.todict(typedef.ctype)}
     
     def print_struct(self, struct):
-        res = {"type": struct.variety, "name": struct.tag, "attrib": struct.attrib}
+        res = {"type": struct.variety, "name": struct.tag, "attrib": self.todict(struct.attrib)}
         if not struct.opaque:
             res["fields"] = []
             for name, ctype in struct.members:
-                field = {"name": name, "ctype": todict(ctype)}
+                field = {"name": name, "ctype": self.todict(ctype)}
                 if isinstance(ctype, CtypesBitfield):
                     field["bitfield"] = ctype.bitfield.py_string(False)
                 res["fields"].append(field)
@@ -86,7 +196,7 @@ class WrapperPrinter:
         if not enum.opaque:
             res["fields"] = []
             for name, ctype in enum.members:
-                field = {"name": name, "ctype": todict(ctype)}
+                field = {"name": name, "ctype": self.todict(ctype)}
                 res["fields"].append(field)
         return res
     
@@ -95,16 +205,16 @@ class WrapperPrinter:
             "type": "function",
             "name": function.c_name(),
             "variadic": function.variadic,
-            "args": todict(function.argtypes),
-            "return": todict(function.restype),
-            "attrib": function.attrib,
+            "args": self.todict(function.argtypes),
+            "return": self.todict(function.restype),
+            "attrib": self.todict(function.attrib),
         }
         if self.options.library:
             res["source"] = self.options.library
         return res
     
     def print_variable(self, variable):
-        res = {"type": "variable", "ctype": todict(variable.ctype), "name": variable.c_name()}
+        res = {"type": "variable", "ctype": self.todict(variable.ctype), "name": variable.c_name()}
         if self.options.library:
             res["source"] = self.options.library
         return res
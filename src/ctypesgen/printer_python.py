@@ -1,3 +1,5 @@
+import io
+import os
 import shutil
 import functools
 from pathlib import Path
@@ -20,18 +22,8 @@ CTYPESGEN_DIR = Path(__file__).resolve().parent
 LIBRARYLOADER_PATH = CTYPESGEN_DIR/"libraryloader.py"
 
 
-def noop(*args, **kwargs):
-    pass
-
-def ParagraphCtxFactory(file):
-    @contextmanager
-    def paragraph_ctx(txt):
-        file.write(f"# -- Begin {txt} --")
-        try:
-            yield
-        finally:
-            file.write(f"\n# -- End {txt} --")
-    return paragraph_ctx
+def _no_srcinfo(obj):
+    return ""
 
 @functools.lru_cache(maxsize=1)
 def get_priv_paths():
@@ -42,14 +34,26 @@ def get_priv_paths():
     priv_paths.sort(key=lambda x: len(str(x[0])), reverse=True)
     return priv_paths
 
+@functools.lru_cache(maxsize=1)
+def get_priv_prefixes():
+    # string form of get_priv_paths(), so txtpath() can match with str.startswith() rather than walking Path.parents
+    # normcase() makes the comparison case-insensitive on Windows, like pathlib's
+    prefixes = []
+    for strip_p, x in get_priv_paths():
+        strip_s = os.path.normcase(strip_p)
+        prefix = strip_s if strip_s.endswith(os.sep) else strip_s + os.sep
+        prefixes.append((strip_s, prefix, x))
+    return prefixes
+
 def txtpath(p):
     # Returns a path string suitable for embedding into the output, with private paths stripped
-    p = Path(p)
-    for strip_p, x in get_priv_paths():
-        # should be equivalent to `p.is_relative_to(strip_p)` or `p.parts[:len(strip_p.parts)] == strip_p.parts`
-        if strip_p in p.parents or p == strip_p:
-            return x + str(p)[len(str(strip_p)):]
-    return str(p)
+    p = str(Path(p))
+    cmp_p = os.path.normcase(p)
+    for strip_s, prefix, x in get_priv_prefixes():
+        # should be equivalent to `p.is_relative_to(strip_p)`, given the normalization by Path()
+        if cmp_p.startswith(prefix) or cmp_p == strip_s:
+            return x + p[len(strip_s):]
+    return p
 
 def _embed_file_impl(dst_fh, src_fp):
     with open(src_fp, "r") as src_fh:
@@ -70,54 +74,79 @@ class WrapperPrinter:
     def __init__(self, outpath, opts, data, cmd_str):
         
         self.opts = opts
+        self._pystr_cache = {}
+        self._txtpath_cache = {}
         
         if self.opts.no_srcinfo:
-            self._srcinfo = noop
+            self._srcinfo = _no_srcinfo
         
-        with outpath.open("w", encoding="utf-8") as self.file:
-            
-            self.paragraph_ctx = ParagraphCtxFactory(self.file)
-            
-            self.file.write(f'R"""\nAuto-generated by:\n{cmd_str}\n"""')
-            self.file.write(
-                "\n\nimport ctypes"
-                "\nfrom ctypes import *"
-            )
-            
-            if opts.modules:
-                self.file.write("\n\n# Linked modules")
-                for mod in opts.modules:
-                    self.file.write(f"\nfrom {mod} import *")
-            
-            if opts.dllclass == "pythonapi":
-                assert opts.library == "python"
-                self.file.write("\n\n_libs = {%r: ctypes.pythonapi}" % (opts.library, ))
-                self._print_templates(self.file)
+        # collect the output in memory and write it at once, rather than going through the file object for each of the many small writes
+        self.file = io.StringIO()
+        
+        self.file.write(f'R"""\nAuto-generated by:\n{cmd_str}\n"""')
+        self.file.write(
+            "\n\nimport ctypes"
+            "\nfrom ctypes import *"
+        )
+        
+        if opts.modules:
+            self.file.write("\n\n# Linked modules")
+            for mod in opts.modules:
+                self.file.write(f"\nfrom {mod} import *")
+        
+        if opts.dllclass == "pythonapi":
+            assert opts.library == "python"
+            self.file.write("\n\n_libs = {%r: ctypes.pythonapi}" % (opts.library, ))
+            self._print_templates(self.file)
+        else:
+            self.print_loader(opts)
+            if opts.library:
+                self.print_library(opts)
             else:
-                self.print_loader(opts)
-                if opts.library:
-                    self.print_library(opts)
-                else:
-                    warning_message("No library name specified. Assuming pure headers without binary symbols.", cls="usage")
-            
-            self.file.write("\n\n\n")
-            with self.paragraph_ctx("header members"):
-                for kind, desc in data:
-                    self.file.write("\n\n")
-                    getattr(self, f"print_{kind}")(desc)
-                self.file.write("\n")
-            
-            for fp in opts.inserted_files:
-                self.file.write("\n\n\n")
-                self._embed_file(fp, f"inserted file {txtpath(fp)!r}")
-            
+                warning_message("No library name specified. Assuming pure headers without binary symbols.", cls="usage")
+        
+        self.file.write("\n\n\n")
+        with self.paragraph_ctx("header members"):
+            for kind, desc in data:
+                self.file.write("\n\n")
+                getattr(self, f"print_{kind}")(desc)
             self.file.write("\n")
+        
+        for fp in opts.inserted_files:
+            self.file.write("\n\n\n")
+            self._embed_file(fp, f"inserted file {txtpath(fp)!r}")
+        
+        self.file.write("\n")
+        
+        outpath.write_text(self.file.getvalue(), encoding="utf-8")
     
     
+    @contextmanager
+    def paragraph_ctx(self, txt):
+        self.file.write(f"# -- Begin {txt} --")
+        try:
+            yield
+        finally:
+            self.file.write(f"\n# -- End {txt} --")
+    
     def _srcinfo(self, obj):
         # NOTE Could skip lineno if `fp in ("<built-in>", "<command line>")`, but this doesn't seem worth the if-check
         fp, lineno = obj.src
-        self.file.write(f"# {txtpath(fp)}: {lineno}\n")
+        # there are only a few distinct source files, so strip each path once
+        tp = self._txtpath_cache.get(fp)
+        if tp is None:
+            tp = self._txtpath_cache[fp] = txtpath(fp)
+        # returned rather than written, so callers can emit it together with the entry
+        return f"# {tp}: {lineno}\n"
+    
+    def _pystr(self, ctype):
+        # ctype instances may be shared between several descriptions, so only stringify them once
+        # the ctypes stay alive throughout printing, so keying by id() is safe
+        try:
+            return self._pystr_cache[id(ctype)]
+        except KeyError:
+            s = self._pystr_cache[id(ctype)] = ctype.py_string()
+            return s
     
     def _embed_file(self, fp, desc):
         with self.paragraph_ctx(desc):
@@ -164,14 +193,19 @@ class WrapperPrinter:
     
     def print_library(self, opts):
         name_define = f"name = {opts.library!r}"
+        mode_import, mode_define = "", ""
+        if opts.dlopen_flags:
+            # resolve the flags at runtime, as their values differ across platforms
+            mode_import = "import os\n"
+            mode_define = "\n    mode = " + " | ".join(f"os.{f}" for f in opts.dlopen_flags) + ","
         content = f"""\
 # Load library {opts.library!r}
 
-_register_library(
+{mode_import}_register_library(
     {name_define},
     dllclass = ctypes.{opts.dllclass},
     dirs = {opts.runtime_libdirs},
-    search_sys = {opts.search_sys},
+    search_sys = {opts.search_sys},{mode_define}
 )\
 """
         if opts.embed_templates:
@@ -189,47 +223,39 @@ _register_library(
     
     def print_function(self, function):
         assert self.opts.library, "Binary symbol requires --library LIBNAME"
-        self._srcinfo(function)
         
         # we have to do string based attribute access because the CN might conflict with a python keyword, while the PN is supposed to be renamed
-        template = """\
-{PN} = _libs[{L!r}][{CN!r}]
-{PN}.argtypes = ({ATS})
-{PN}.restype = {RT}\
-"""
-        fields = dict(
-            L=self.opts.library,
-            CN=function.c_name(),
-            PN=function.py_name(),
-            ATS=_as_tuple_contents(a.py_string() for a in function.argtypes),
-            RT=function.restype.py_string(),
+        L, CN, PN = self.opts.library, function.c_name(), function.py_name()
+        ATS = _as_tuple_contents(self._pystr(a) for a in function.argtypes)
+        entry = (
+            f"{PN} = _libs[{L!r}][{CN!r}]"
+            f"\n{PN}.argtypes = ({ATS})"
+            f"\n{PN}.restype = {self._pystr(function.restype)}"
         )
         if function.errcheck:
-            template += "\n{PN}.errcheck = {EC}"
-            fields["EC"] = function.errcheck.py_string()
+            entry += f"\n{PN}.errcheck = {function.errcheck.py_string()}"
         
         if self.opts.guard_symbols:
-            template = "if hasattr(_libs[{L!r}], {CN!r}):\n" + indent(template, prefix=" "*4)
+            entry = f"if hasattr(_libs[{L!r}], {CN!r}):\n" + indent(entry, prefix=" "*4)
         
-        self.file.write(template.format(**fields))
+        self.file.write(self._srcinfo(function) + entry)
     
     
     def print_variable(self, variable):
         assert self.opts.library, "Binary symbol requires --library LIBNAME"
-        self._srcinfo(variable)
         # TODO move this to an earlier part of the control flow
         # Ideally, empty arrays should always be handled as arrays (not pointers) unless in a function declaration.
         if isinstance(variable.ctype, CtypesArray) and variable.ctype.count is None:
             variable.ctype.count = ConstantExpressionNode(0)
         entry = "{PN} = ({PS}).in_dll(_libs[{L!r}], {CN!r})".format(
             PN=variable.py_name(),
-            PS=variable.ctype.py_string(),
+            PS=self._pystr(variable.ctype),
             L=self.opts.library,
             CN=variable.c_name(),
         )
         if self.opts.guard_symbols:
             entry = self._try_except_wrap(entry)
-        self.file.write(entry)
+        self.file.write(self._srcinfo(variable) + entry)
     
     
     def _handle_struct_extras(self, struct):
@@ -248,7 +274,7 @@ _register_library(
         
         # handle unnamed fields
         unnamed_fields = []
-        names = set(n for n, *_ in struct.members)
+        names = {n for n, *_ in struct.members if n is not None}
         n = 1
         for mi, (mem_name, mem_type, *mem_other) in enumerate(struct.members):
             if mem_name is not None: continue
@@ -265,9 +291,8 @@ _register_library(
     def print_struct(self, struct):
         # input produced by CtypesParser.make_struct_from_specifier()
         
-        self._srcinfo(struct)
         base = {"union": "Union", "struct": "Structure"}[struct.variety]
-        self.file.write(f"class {struct.variety}_{struct.tag} ({base}):")
+        self.file.write(self._srcinfo(struct) + f"class {struct.variety}_{struct.tag} ({base}):")
         pad = "\n" + " "*4
         
         if struct.opaque:
@@ -286,47 +311,45 @@ _register_library(
     def print_struct_fields(self, struct):
         # Fields are defined indepedent of the actual class to handle forward declarations, including self-references and cyclic structs
         # https://docs.python.org/3/library/ctypes.html#incomplete-types
-        self.file.write(f"{struct.variety}_{struct.tag}._fields_ = (")
         pad = "\n    "
-        for name, ct in struct.members:
-            if isinstance(ct, CtypesBitfield):
-                self.file.write(pad + f"({name!r}, {ct.py_string()}, {ct.bitfield.py_string(False)}),")
-            else:
-                self.file.write(pad + f"({name!r}, {ct.py_string()}),")
-        self.file.write("\n)")
+        if any(isinstance(ct, CtypesBitfield) for _, ct in struct.members):
+            fields = "".join(
+                pad + f"({name!r}, {self._pystr(ct)}, {ct.bitfield.py_string(False)}),"
+                if isinstance(ct, CtypesBitfield) else
+                pad + f"({name!r}, {self._pystr(ct)}),"
+                for name, ct in struct.members
+            )
+        else:  # common case
+            fields = "".join(pad + f"({name!r}, {self._pystr(ct)})," for name, ct in struct.members)
+        self.file.write(f"{struct.variety}_{struct.tag}._fields_ = ({fields}\n)")
     
     
     def print_enum(self, enum):
         # NOTE values of enumerator are output as constants
-        self._srcinfo(enum)
-        self.file.write(f"enum_{enum.tag} = c_int")
+        self.file.write(self._srcinfo(enum) + f"enum_{enum.tag} = c_int")
     
     def print_constant(self, constant):
-        self._srcinfo(constant)
-        self.file.write(f"{constant.name} = {constant.value.py_string(False)}")
+        self.file.write(self._srcinfo(constant) + f"{constant.name} = {constant.value.py_string(False)}")
     
     def print_typedef(self, typedef):
-        self._srcinfo(typedef)
-        self.file.write(f"{typedef.name} = {typedef.ctype.py_string()}")
+        self.file.write(self._srcinfo(typedef) + f"{typedef.name} = {self._pystr(typedef.ctype)}")
     
     def print_macro(self, macro):
-        self._srcinfo(macro)
         # important: must check precisely against None because params may be an empty list for a func macro
         if macro.params is None:  # simple macro
             entry = f"{macro.name} = {macro.expr.py_string(True)}"
             if self.opts.guard_macros:
                 entry = self._try_except_wrap(entry)
-            self.file.write(entry)
         else:  # func macro
-            self.file.write(
+            entry = (
                 f"def {macro.name}({', '.join(macro.params)}):"
                 f"\n    return {macro.expr.py_string(True)}"
             )
+        self.file.write(self._srcinfo(macro) + entry)
     
     def print_undef(self, undef):
-        self._srcinfo(undef)
         name = undef.macro.py_string(False)
         entry = f"del {name}"
         if self.opts.guard_macros:
             entry = self._try_except_wrap(entry)
-        self.file.write(entry)
+        self.file.write(self._srcinfo(undef) + entry)
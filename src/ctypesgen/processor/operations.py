@@ -4,10 +4,12 @@ DescriptionCollection and prepare it for output.
 ctypesgen.processor.pipeline calls the operations module.
 """
 
+import os
 import re
 import sys
 import ctypes
 import keyword
+import itertools
 import traceback
 from pathlib import Path
 
@@ -48,14 +50,22 @@ def mask_external_members(data, opts):
     outside of the header files specified from the command line."""
     # Naively match against header names rather than full paths to avoid relying on pre-processor path expansion details
     # e.g. pcpp does not generally output full paths (integrating pcpp with ctypesgen is experimental)
-    input_header_names = [Path(h).name for h in opts.headers + opts.system_headers]
+    input_header_names = {Path(h).name for h in opts.headers + opts.system_headers}
+    all_headers, builtin_symbols = opts.all_headers, opts.builtin_symbols
+    # there are only a few distinct source files, so determine whether each is external only once
+    is_external = {}
     for desc in data.all:
-        if desc.src[0] == "<command line>":
+        fp = desc.src[0]
+        if fp == "<command line>":
             desc.include_rule = "if_needed"
-        elif desc.src[0] == "<built-in>" and not opts.builtin_symbols:
-            desc.include_rule = "if_needed"
-        elif not (Path(desc.src[0]).name in input_header_names or opts.all_headers):
+        elif fp == "<built-in>" and not builtin_symbols:
             desc.include_rule = "if_needed"
+        elif not all_headers:
+            external = is_external.get(fp)
+            if external is None:
+                external = is_external[fp] = Path(fp).name not in input_header_names
+            if external:
+                desc.include_rule = "if_needed"
 
 
 def remove_macros(data, opts):
@@ -66,15 +76,36 @@ def remove_macros(data, opts):
 
 
 def filter_by_regex_rules(data, opts):
+    if not opts.symbol_rules: return
+    rules = []
     for rule_entry in opts.symbol_rules:
         rule_name, symbols_regex = rule_entry.split("=", maxsplit=1)
         if rule_name not in {"never", "if_needed", "yes"}:
             raise ValueError(f"Unknown include rule {rule_name!r}")
         symbols_regex = "(" + symbols_regex + ")"
-        expr = re.compile(symbols_regex)
-        for desc in data.all:
-            if expr.fullmatch(desc.py_name()):
+        rules.append((rule_name, re.compile(symbols_regex)))
+    # later rules take precedence, so test in reverse order and stop at the first match
+    rules.reverse()
+    for desc in data.all:
+        py_name = desc.py_name()
+        for rule_name, expr in rules:
+            if expr.fullmatch(py_name):
                 desc.include_rule = rule_name
+                break
+
+
+# The names that don't depend on the options are constant, so collect them only once.
+# Later entries take precedence for the reason string.
+_OUR_NAMES_REASON = "a name from ctypes or ctypesgen"
+_STATIC_PROTECTED_NAMES = {
+    **dict.fromkeys(("_libs", "_libs_info", "UNCHECKED"), _OUR_NAMES_REASON),
+    # probably includes a bit more than we actually use ...
+    **dict.fromkeys((x for x in dir(ctypes) if not x.startswith("_")), _OUR_NAMES_REASON),
+    # NOTE outside of __main__, __builtins__ is the builtins module's dict, so this actually yields the names of dict attributes.
+    # Protecting the real builtins would rename common C functions like pow() or abs(), so keep the historical behavior for now.
+    **dict.fromkeys(dir(__builtins__), "a Python builtin"),
+}
+_KEYWORD_NAMES = dict.fromkeys(keyword.kwlist, "a Python keyword")
 
 
 def fix_conflicting_names(data, opts):
@@ -84,50 +115,36 @@ def fix_conflicting_names(data, opts):
     
     status_message("Looking for conflicting names...")
     
-    our_names = {
-        "_libs",
-        "_libs_info",
-        "UNCHECKED",
-    }
-    if opts.string_template:
-        our_names |= {"String", "WideString"}
-    # probably includes a bit more than we actually use ...
-    our_names |= {x for x in dir(ctypes) if not x.startswith("_")}
-    
     # This dictionary maps names to a string representing where the name came from.
-    protected_names = {}
-    for name in our_names:
-        protected_names[name] = "a name from ctypes or ctypesgen"
-    for name in dir(__builtins__):
-        protected_names[name] = "a Python builtin"
+    protected_names = _STATIC_PROTECTED_NAMES.copy()
+    if opts.string_template:
+        protected_names.update(dict.fromkeys(("String", "WideString"), _OUR_NAMES_REASON))
     for name in opts.linked_symbols:
         # known issue: linked modules are naively prioritized throughout ctypesgen, i.e. intentional overloads are ignored
         protected_names[name] = "a name from a linked Python module"
-    for name in keyword.kwlist:
-        protected_names[name] = "a Python keyword"
+    protected_names.update(_KEYWORD_NAMES)
     
     # This is the order of priority for names
-    descriptions = (
-        data.functions
-        + data.variables
-        + data.structs
-        + data.typedefs
-        + data.enums
-        + data.constants
-        + data.macros
+    descriptions = itertools.chain(
+        data.functions,
+        data.variables,
+        data.structs,
+        data.typedefs,
+        data.enums,
+        data.constants,
+        data.macros,
     )
     
     for desc in descriptions:
         
-        if desc.py_name() not in protected_names: continue
-            
-        conflict_name = protected_names[desc.py_name()]
+        # a dict lookup is as cheap as a set membership check, so there's no need for a separate set of names
+        conflict_name = protected_names.get(desc.py_name())
+        if conflict_name is None: continue
+        
         original_name = desc.casual_name()
+        attr = "tag" if isinstance(desc, (StructDescription, EnumDescription)) else "name"
         while desc.py_name() in protected_names:
-            if isinstance(desc, (StructDescription, EnumDescription)):
-                desc.tag += "_"
-            else:
-                desc.name += "_"
+            setattr(desc, attr, getattr(desc, attr) + "_")
         
         message = f"{original_name} has been renamed to {desc.casual_name()} due to a name conflict with {conflict_name}."
         if desc.dependents:
@@ -146,7 +163,7 @@ def fix_conflicting_names(data, opts):
         if struct.opaque: continue  # no members
         for i, (name, type) in enumerate(struct.members):
             # it should be safe to expect there will be no underscored sibling to a keyword, so we needn't loop
-            if name not in keyword.kwlist: continue
+            if not keyword.iskeyword(name): continue
             struct.members[i] = (f"{name}_", type)
             struct.warning(
                 f"Member '{name}' of {struct.casual_name()} has been renamed to '{name}_' because it has the same name as a Python keyword.",
@@ -159,7 +176,7 @@ def fix_conflicting_names(data, opts):
     for macro in data.macros:
         if not macro.params: continue  # may be None
         for param in macro.params:
-            if param not in keyword.kwlist: continue
+            if not keyword.iskeyword(param): continue
             macro.error(
                 f"One of the params to {macro.casual_name()}, '{param}', has the same name as a Python keyword. {macro.casual_name()} will be excluded.",
                 cls="name-conflict",
@@ -182,12 +199,41 @@ def free_library(lib_handle):
         ctypes_backend.dlclose(lib_handle)
 
 
+if hasattr(ctypes_backend, "dlsym"):
+    def has_symbol(library, name):
+        # look up the symbol directly, rather than having ctypes create (and cache) a function pointer object through hasattr()
+        try:
+            ctypes_backend.dlsym(library._handle, name)
+        except OSError:
+            return False
+        return True
+else:
+    def has_symbol(library, name):
+        # unlike attribute access, item access doesn't cache the function pointer on the library object
+        try:
+            library[name]
+        except AttributeError:
+            return False
+        return True
+
+
 def check_symbols(data, opts):
     
     if opts.no_load_library or not opts.library or opts.dllclass == "pythonapi":
         status_message(f"No library loading.")
         return
     
+    mode = ctypes.DEFAULT_MODE
+    if opts.dlopen_flags:
+        mode = 0
+        for flag in opts.dlopen_flags:
+            mode |= getattr(os, flag)
+    
+    # the loader's lookup caches live as long as the process, so don't let them carry over stale results from an earlier run
+    libraryloader._find_library_cached.cache_clear()
+    libraryloader._find_system_library.cache_clear()
+    libraryloader._resolve_reldir.cache_clear()
+    
     try:
         libraryloader.__file__ = str(Path.cwd() / "spoofed_ll.py")
         libraryloader._register_library(
@@ -195,6 +241,7 @@ def check_symbols(data, opts):
             dllclass = getattr(ctypes, opts.dllclass),
             dirs = opts.compile_libdirs,
             search_sys = opts.search_sys,
+            mode = mode,
         )
         library = libraryloader._libs[opts.library]
     except (ImportError, OSError):
@@ -203,8 +250,12 @@ def check_symbols(data, opts):
         return
     
     try:
-        missing_symbols = {s for s in (data.functions + data.variables) if s.include_rule != "never" and not hasattr(library, s.c_name())}
+        candidates = (s for s in itertools.chain(data.functions, data.variables) if s.include_rule != "never")
+        missing_symbols = {s for s in candidates if not has_symbol(library, s.c_name())}
     finally:
+        # drop the loader's references first, so a freed handle can't be reused by a later run
+        del libraryloader._libs[opts.library]
+        libraryloader._lib_handles.clear()
         free_library(library._handle); del library
     
     if missing_symbols:
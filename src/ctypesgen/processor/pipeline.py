@@ -26,12 +26,15 @@ the user with error messages regarding descriptions that would not be in the
 output anyway. It also prints 'description.warnings'.
 
 7. calculate_final_inclusion() is called again to recalculate based on
-the errors that print_errors_encountered() has flagged.
+the errors that print_errors_encountered() has flagged, if there are any.
 
 """
 
+import logging
+
 from ctypesgen.descriptions import MacroDescription
 from ctypesgen.messages import (
+    log,
     error_message,
     status_message,
     warning_message,
@@ -64,79 +67,107 @@ def process(data, options):
     
     check_symbols(data, options)
     calculate_final_inclusion(data, options)
-    print_errors_encountered(data, options)
-    calculate_final_inclusion(data, options)
+    # only recalculate if errors actually excluded any further descriptions, and build on the previous result
+    newly_excluded = print_errors_encountered(data, options)
+    if newly_excluded:
+        calculate_final_inclusion(data, options, newly_excluded)
 
 
-def calculate_final_inclusion(data, opts):
+def calculate_final_inclusion(data, opts, newly_excluded=None):
     """Calculates which descriptions will be included in the output library.
 
     An object with include_rule="never" is never included.
     An object with include_rule="yes" is included if its requirements can be included.
     An object with include_rule="if_needed" is included if an object to be included
         requires it and if its requirements can be included.
+    
+    If newly_excluded is given, the previous result is updated for these descriptions
+    having been set to include_rule="never" since.
     """
     
-    def can_include_desc(desc):
-        if desc.can_include is None:
-            if desc.include_rule == "never":
-                desc.can_include = False
-            elif desc.include_rule in ("yes", "if_needed"):
-                desc.can_include = True
-                for req in desc.requirements:
-                    if not can_include_desc(req):
-                        desc.can_include = False
-            else:
-                assert False, f"unknown include rule {desc.include_rule!r}"
-        return desc.can_include
+    # The graph walks are iterative, as the requirement chains of large headers may exceed the recursion limit.
     
-    def do_include_desc(desc):
-        if desc.included:
-            return  # We've already been here
-        desc.included = True
-        for req in desc.requirements:
-            do_include_desc(req)
+    # Requirements may be cyclic (e.g. struct and struct_fields depend on each other), which is fine.
+    # A desc can be included if no desc it (transitively) requires has include rule "never", so propagate exclusion backwards along the dependents, starting from the excluded descs.
+    # Unlike a depth-first walk over the requirements, this doesn't depend on traversal order within cycles.
     
-    for desc in data.all:
-        desc.can_include = None  # None means "Not Yet Decided"
-        desc.included = False
+    if newly_excluded is None:
+        excluded = []
+        for desc in data.all:
+            assert desc.include_rule in ("yes", "if_needed", "never"), f"unknown include rule {desc.include_rule!r}"
+            desc.can_include = desc.include_rule != "never"
+            desc.included = False
+            if not desc.can_include:
+                excluded.append(desc)
+    else:
+        # Exclusion only grows, so the previous can_include results stay valid and we just need to propagate from the new ones.
+        excluded = [d for d in newly_excluded if d.can_include]
+        for desc in excluded:
+            desc.can_include = False
+        for desc in data.all:
+            desc.included = False
     
-    for desc in data.all:
-        if desc.include_rule == "yes" and can_include_desc(desc):
-            do_include_desc(desc)
+    while excluded:
+        desc = excluded.pop()
+        for dependent in desc.dependents:
+            if dependent.can_include:
+                dependent.can_include = False
+                excluded.append(dependent)
+    
+    # Include everything reachable from the includable "yes" descs, in a single walk seeded with all of them.
+    # Requirements of an includable desc are includable as well, so they needn't be checked again.
+    stack = [d for d in data.all if d.include_rule == "yes" and d.can_include]
+    while stack:
+        desc = stack.pop()
+        if desc.included:
+            continue  # We've already been here
+        desc.included = True
+        stack.extend(desc.requirements)
 
 
 def print_errors_encountered(data, opts):
     # See descriptions.py for an explanation of the error-handling mechanism
+    # Returns the descriptions whose include rule was changed to "never".
+    show_all_errors, show_long_errors, show_macro_warnings = opts.show_all_errors, opts.show_long_errors, opts.show_macro_warnings
+    # errors are the most severe messages we emit, so if they're disabled, skip formatting altogether
+    enabled = log.isEnabledFor(logging.ERROR)
+    newly_excluded = []
     for desc in data.all:
+        errors, warnings = desc.errors, desc.warnings
+        if not (errors or warnings):
+            continue  # common case
         # If description would not have been included, dont bother user by
         # printing warnings.
-        if desc.included or opts.show_all_errors:
-            if opts.show_long_errors or len(desc.errors) + len(desc.warnings) <= 2:
-                for error, cls in desc.errors:
-                    # Macro errors will always be displayed as warnings.
-                    if isinstance(desc, MacroDescription):
-                        if opts.show_macro_warnings:
+        if enabled and (desc.included or show_all_errors):
+            if show_long_errors or len(errors) + len(warnings) <= 2:
+                # Macro errors will always be displayed as warnings.
+                if isinstance(desc, MacroDescription):
+                    if show_macro_warnings:
+                        for error, cls in errors:
                             warning_message(error, cls)
-                    else:
+                else:
+                    for error, cls in errors:
                         error_message(error, cls)
-                for warning, cls in desc.warnings:
+                for warning, cls in warnings:
                     warning_message(warning, cls)
             
             else:
-                if desc.errors:
-                    error1, cls1 = desc.errors[0]
+                if errors:
+                    error1, cls1 = errors[0]
                     error_message(error1, cls1)
-                    numerrs = len(desc.errors) - 1
-                    numwarns = len(desc.warnings)
+                    numerrs = len(errors) - 1
+                    numwarns = len(warnings)
                     if numwarns:
                         error_message(f"{numerrs} more errors and {numwarns} more warnings for {desc.casual_name()}")
                     else:
                         error_message(f"{numerrs} more errors for {desc.casual_name()}")
                 else:
-                    warning1, cls1 = desc.warnings[0]
+                    warning1, cls1 = warnings[0]
                     warning_message(warning1, cls1)
-                    warning_message(f"{len(desc.warnings)-1} more errors for {desc.casual_name()}")
-        if desc.errors:
+                    warning_message(f"{len(warnings)-1} more errors for {desc.casual_name()}")
+        if errors and desc.include_rule != "never":
             # process() will recalculate to take this into account
             desc.include_rule = "never"
+            newly_excluded.append(desc)
+    
+    return newly_excluded
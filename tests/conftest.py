@@ -3,6 +3,7 @@ import sys
 import json
 import atexit
 import types
+import hashlib
 import shlex
 import shutil
 import subprocess
@@ -19,6 +20,8 @@ TMP_DIR = TEST_DIR/"tmp"
 
 CLEANUP_OK = bool(int(os.environ.get("CLEANUP_OK", "1")))
 MAIN_CPP = os.environ.get("CPP", None)
+# opt-in cache for preprocessor output, to speed up repeated local test runs
+PREPROC_CACHEDIR = os.environ.get("PREPROC_CACHEDIR", None)
 
 
 def _remove_tmpdir():
@@ -39,12 +42,20 @@ def ctypesgen_wrapper(args, echo=True):
         print(str_args, file=sys.stderr)
     return ctypesgen.__main__.main(args)
 
+_CODE_CACHE = {}
+
 def module_from_code(name, python_code, spoof_dir=None):
     if spoof_dir:
         file_spoof = f"__file__ = {str(spoof_dir/'spoof.py')!r}\n\n"
         python_code = file_spoof + python_code
+    # identical bindings are generated repeatedly across tests, so only compile each distinct source once
+    key = hashlib.blake2b(python_code.encode(), digest_size=16).hexdigest()
+    code = _CODE_CACHE.get(key)
+    if code is None:
+        filename = str(spoof_dir/'spoof.py') if spoof_dir else "<generated>"
+        code = _CODE_CACHE[key] = compile(python_code, filename, "exec", dont_inherit=True)
     module = types.ModuleType(name)
-    exec(python_code, module.__dict__)
+    exec(code, module.__dict__)
     return module
 
 
@@ -69,6 +80,7 @@ def generate(header=None, args=(), lang="py", cpp=MAIN_CPP, allow_gnuc=False, sp
     
     if cpp: cmdargs += ["--cpp", cpp]
     if allow_gnuc: cmdargs += ["-X", "__GNUC__"]
+    if PREPROC_CACHEDIR: cmdargs += ["--preproc-cachedir", PREPROC_CACHEDIR]
     cmdargs += ["--output-language", lang, *args]
     
     try:
@@ -132,9 +144,8 @@ void bar(struct mystruct *m) { }
 
 
 def _compile_common(common_lib):
-    subprocess.run(["gcc", "-c", COMMON_DIR/"a.c", "-o", COMMON_DIR/"a.o"])
-    subprocess.run(["gcc", "-c", COMMON_DIR/"b.c", "-o", COMMON_DIR/"b.o"])
-    subprocess.run(["gcc", "-shared", "-o", COMMON_DIR/common_lib, COMMON_DIR/"a.o", COMMON_DIR/"b.o"])
+    # compile and link in one go, rather than spawning a process per step
+    subprocess.run(["gcc", "-shared", "-fPIC", "-o", COMMON_DIR/common_lib, COMMON_DIR/"a.c", COMMON_DIR/"b.c"], check=True)
 
 
 def _generate_with_common(file_name, shared):
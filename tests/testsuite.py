@@ -28,8 +28,11 @@ import os
 import ctypes
 import math
 import unittest
+import shutil
 import subprocess
 import functools
+from types import SimpleNamespace
+from unittest import mock
 from contextlib import (
     redirect_stdout,
     redirect_stderr,
@@ -37,7 +40,11 @@ from contextlib import (
 
 from ctypesgen import VERSION
 import ctypesgen.__main__ as ctg_main
+from ctypesgen.descriptions import ConstantDescription
 from ctypesgen.processor.operations import free_library
+from ctypesgen.processor.pipeline import calculate_final_inclusion
+from ctypesgen.parser.preprocessor import PreprocessorParser
+from ctypesgen import printer_json
 from .conftest import (
     cleanup_common,
     generate,
@@ -226,6 +233,57 @@ class MathTest(TestCaseWithCleanup):
         self.assertEqual(self.module.sin_plus_y(2, 1), math.sin(2) + 1)
 
 
+@unittest.skipIf(sys.platform.startswith("win"), "dlopen flags are POSIX only")
+class DlopenFlagsTest(TestCaseWithCleanup):
+
+    @classmethod
+    def setUpClass(cls):
+        header_str = """
+#include <math.h>
+"""
+        cls.module = generate(header_str, ["-l", MATHLIB_NAME, "--all-headers", "--symbol-rules", "never=NAN", r"if_needed=__\w+", "--dlopen-flags", "RTLD_NOW", "RTLD_GLOBAL"])
+
+    def test_sqrt(self):
+        self.assertEqual(self.module.sqrt(4), 2)
+    
+    def test_conflicting_flags(self):
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            ctg_main.get_parser().parse_args(["--dlopen-flags", "RTLD_LAZY", "RTLD_NOW"])
+    
+    @unittest.skipUnless(sys.platform.startswith("linux"), "requires GNU ld and eager binding by default")
+    def test_lazy_binding(self):
+        # a library with an unresolved symbol can only be loaded if the mode actually reaches dlopen()
+        lib_dir = TMP_DIR/"lazy_lib"
+        lib_dir.mkdir()
+        try:
+            (lib_dir/"lazy.c").write_text("void ctypesgen_undefined(void);\nvoid lazy_func(void) { ctypesgen_undefined(); }\n")
+            subprocess.run(["gcc", "-shared", "-fPIC", "-o", lib_dir/"liblazy.so", lib_dir/"lazy.c"], check=True)
+            header_str = "void lazy_func(void);"
+            args = ["-l", "lazy", "-L", lib_dir, "--runtime-libdirs", lib_dir]
+            # check the default mode first, as dlopen() would hand out the existing handle once the library is loaded
+            with self.assertRaisesRegex(OSError, "undefined symbol"):
+                generate(header_str, args)
+            module = generate(header_str, [*args, "--dlopen-flags", "RTLD_LAZY"])
+            self.assertTrue(hasattr(module, "lazy_func"))
+        finally:
+            if CLEANUP_OK: shutil.rmtree(lib_dir)
+
+
+class MissingSymbolsTest(TestCaseWithCleanup):
+
+    @classmethod
+    def setUpClass(cls):
+        header_str = """
+double sqrt(double x);
+double ctypesgen_missing_symbol(double x);
+"""
+        cls.module = generate(header_str, ["-l", MATHLIB_NAME, "--no-symbol-guards"])
+
+    def test_excluded(self):
+        self.assertEqual(self.module.sqrt(4), 2)
+        self.assertFalse(hasattr(self.module, "ctypesgen_missing_symbol"))
+
+
 class CommonHeaderTest(unittest.TestCase):
     
     @classmethod
@@ -383,7 +441,7 @@ class SimpleMacrosTest(TestCaseWithCleanup):
             self._json("C"),
             {
                 "args": ["a", "b", "c"],
-                "body": "a and b or c",
+                "body": "(b if a else c)",
                 "name": "C",
                 "type": "macro_function",
             },
@@ -403,6 +461,10 @@ class SimpleMacrosTest(TestCaseWithCleanup):
         """Test ?: with false, using values that can not be confused between True and 1"""
         self.assertEqual(self.module.C(False, 99, 100), 100)
 
+    def test_macro_ternary_true_falsy(self):
+        """Test ?: with true, where the chosen value is falsy"""
+        self.assertEqual(self.module.C(True, 0, 100), 0)
+
     def test_macro_string_compose(self):
         self.assertEqual(self.module.funny("bunny"), "funnybunny")
 
@@ -624,6 +686,35 @@ typedef struct {
         json_ans = json_expects.get_ans_struct(self.tmp_header_path)
         json_expects.compare_json(self, StructuresTest.json, json_ans, True)
 
+    def test_attrib_json(self):
+        """Test whether struct attributes holding expressions are serialized."""
+        header_str = """
+struct __attribute__((aligned(8))) aligned_foo {
+    int a;
+};
+"""
+        output, _ = generate(header_str, lang="json")
+        struct_json = next(item for item in output if item["type"] == "struct")
+        self.assertEqual(
+            struct_json["attrib"],
+            {"aligned": [{"Klass": "ConstantExpressionNode", "errors": [], "is_literal": False, "value": 8}]},
+        )
+
+    @unittest.skipIf(printer_json.orjson is None, "requires orjson")
+    def test_json_format_without_orjson(self):
+        """Test that the stdlib fallback produces the same output as orjson."""
+        header = TMP_DIR/"json_format.h"
+        header.write_text('#define BANANA "\U0001F34C"\nstruct __attribute__((aligned(8))) foo { int a; };\n', encoding="utf-8")
+        outputs = []
+        for i, orjson in enumerate((printer_json.orjson, None)):
+            outfile = TMP_DIR/f"json_format_{i}.json"
+            with mock.patch.object(printer_json, "orjson", orjson):
+                ctypesgen_wrapper(["-i", header, "--output-language", "json", "-o", outfile])
+            outputs.append(outfile.read_bytes())
+            if CLEANUP_OK: outfile.unlink()
+        if CLEANUP_OK: header.unlink()
+        self.assertEqual(outputs[0], outputs[1])
+
     def test_fields(self):
         """Test whether fields are built correctly."""
         struct_foo = StructuresTest.module.struct_foo
@@ -1090,6 +1181,65 @@ void arraytest(int a[]) { };
         self.assertEqual(payload, bytes(payload_back))
 
 
+class PreprocCacheTest(unittest.TestCase):
+    """ Test that cached preprocessor output is used, and invalidated when an included file changes. """
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.infile = TMP_DIR/"cached_header.h"
+        cls.incfile = TMP_DIR/"cached_header_inc.h"
+        cls.outfile = TMP_DIR/"cached_output.py"
+        cls.cachedir = TMP_DIR/"preproc_cache"
+        cls.infile.write_text('#include "cached_header_inc.h"\n')
+    
+    @classmethod
+    def tearDownClass(cls):
+        if CLEANUP_OK:
+            for p in (cls.infile, cls.incfile, cls.outfile): p.unlink(missing_ok=True)
+            shutil.rmtree(cls.cachedir)
+    
+    def _generate(self, expect_cpp, infile=None, args=()):
+        # count the actual preprocessor runs, to tell cache hits from misses
+        with mock.patch.object(PreprocessorParser, "_run_cpp", autospec=True, side_effect=PreprocessorParser._run_cpp) as run_cpp:
+            ctypesgen_wrapper(["-i", infile or self.infile, "-o", self.outfile, "--preproc-cachedir", self.cachedir, "--symbol-rules", "yes=VALUE", *args])
+        self.assertEqual(run_cpp.call_count, int(expect_cpp))
+        return module_from_code("tmp_module", self.outfile.read_text())
+    
+    def test_cache(self):
+        self.incfile.write_text("#define VALUE 1\n")
+        self.assertEqual(self._generate(expect_cpp=True).VALUE, 1)
+        self.assertEqual(len(list(self.cachedir.glob("*.i"))), 1)
+        self.assertEqual(self._generate(expect_cpp=False).VALUE, 1)
+        mtime = self.incfile.stat().st_mtime_ns
+        self.incfile.write_text("#define VALUE 2\n")
+        os.utime(self.incfile, ns=(mtime+10**9, mtime+10**9))
+        self.assertEqual(self._generate(expect_cpp=True).VALUE, 2)
+        self.assertEqual(self._generate(expect_cpp=False).VALUE, 2)
+        # merely touching an included file must also invalidate the cache
+        mtime = self.incfile.stat().st_mtime_ns
+        os.utime(self.incfile, ns=(mtime+10**9, mtime+10**9))
+        self.assertEqual(self._generate(expect_cpp=True).VALUE, 2)
+    
+    def test_failed_run_not_cached(self):
+        # a missing include isn't tracked as dependency, so the output of a failed run must not be cached
+        infile = TMP_DIR/"cached_header_broken.h"
+        missing = TMP_DIR/"cached_header_missing.h"
+        # the preprocessor still emits the output up to the failed include, so the bindings aren't empty
+        infile.write_text('#define OTHER 1\n#include "cached_header_missing.h"\n')
+        try:
+            args = ["--no-preproc-errcheck"]
+            for _ in range(2):
+                module = self._generate(expect_cpp=True, infile=infile, args=args)
+                self.assertEqual(module.OTHER, 1)
+                self.assertFalse(hasattr(module, "VALUE"))
+            missing.write_text("#define VALUE 3\n")
+            self.assertEqual(self._generate(expect_cpp=True, infile=infile, args=args).VALUE, 3)
+        finally:
+            if CLEANUP_OK:
+                infile.unlink()
+                missing.unlink(missing_ok=True)
+
+
 class DefUndefTest(unittest.TestCase):
     """
     Test handling of defines/undefines passed to ctypesgen.
@@ -1121,6 +1271,31 @@ class DefUndefTest(unittest.TestCase):
         self.assertFalse(hasattr(m, "CTYPESGEN"))
 
 
+class SymbolRulesTest(unittest.TestCase):
+    
+    def test_later_rule_takes_precedence(self):
+        m = generate("#define A 1\n#define AB 2\n#define ABC 3", ["--symbol-rules", "never=A.*", "yes=AB"])
+        self.assertFalse(hasattr(m, "A"))
+        self.assertEqual(m.AB, 2)
+        self.assertFalse(hasattr(m, "ABC"))
+
+
+class InclusionTest(unittest.TestCase):
+    
+    def test_cyclic_requirements(self):
+        # a and b require each other, and b requires c, which must not be included
+        # the result must not depend on the order of traversal (set iteration order varies with the instances)
+        for _ in range(10):
+            a, b, c = (ConstantDescription(n, None) for n in "abc")
+            a.add_requirements(b)
+            b.add_requirements(a, c)
+            c.include_rule = "never"
+            for order in ([a, b, c], [b, a, c], [c, b, a]):
+                calculate_final_inclusion(SimpleNamespace(all=order), None)
+                self.assertEqual([d.can_include for d in (a, b, c)], [False, False, False])
+                self.assertEqual([d.included for d in (a, b, c)], [False, False, False])
+
+
 class APITest(unittest.TestCase):
     """ Test that calling ctypesgen through the api_main() entrypoint works """
     